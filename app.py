@@ -4,18 +4,20 @@ import os
 import io
 from PIL import Image
 from core import profile_manager
-from core.biometric_auth import get_image_hash, compare_hashes
+from core.ai_content_generator import start_briefing_prewarm
+from core.biometric_auth import (
+    USER_IMAGES_DIR,
+    REGISTERED_IMAGE_NAME,
+    enroll_face,
+    identify,
+    warm_face_backend,
+)
 
 # -------------------------
 # Streamlit Page Settings
 # -------------------------
 st.set_page_config(page_title="AI OS", page_icon="📱", layout="centered")
 
-ASSETS_DIR = "assets"
-USER_IMAGES_DIR = os.path.join(ASSETS_DIR, "user_images")
-REGISTERED_IMAGE_NAME = "registered_face.png"
-SIMILARITY_THRESHOLD = 10  # Lower = stricter matching
-
 # -------------------------
 # Helpers
 # -------------------------
@@ -24,6 +26,14 @@ def get_registered_users():
         os.makedirs(USER_IMAGES_DIR)
     return sorted(os.listdir(USER_IMAGES_DIR))
 
+@st.cache_resource
+def start_background_jobs():
+    # Once per process: load the face model/templates and build the day's
+    # briefings off the request path.
+    warm_face_backend()
+    start_briefing_prewarm()
+    return True
+
 def navigate_to_dashboard(profile):
     st.session_state["user_profile"] = profile
     st.switch_page("pages/1_Dashboard.py")
@@ -51,6 +61,7 @@ st.markdown(
 st.title("📱 AI Dual-Space OS")
 st.caption("Secure. Personalized. Always with you.")
 
+start_background_jobs()
 registered_users = get_registered_users()
 tab1, tab2 = st.tabs(["🔐 Login", "👤 Register"])
 
@@ -60,36 +71,29 @@ tab1, tab2 = st.tabs(["🔐 Login", "👤 Register"])
 with tab1:
     if registered_users:
         st.subheader("Welcome Back 👋")
-        selected_user = st.selectbox("Choose your profile", registered_users)
 
         login_image_bytes = st.camera_input("Look into the camera to unlock", label_visibility="collapsed")
 
         if st.button("✨ Unlock with Face", use_container_width=True):
             if login_image_bytes:
-                registered_image_path = os.path.join(USER_IMAGES_DIR, selected_user, REGISTERED_IMAGE_NAME)
-                if os.path.exists(registered_image_path):
-                    login_hash = get_image_hash(login_image_bytes.getvalue())
-                    with open(registered_image_path, "rb") as f:
-                        registered_hash = get_image_hash(f.read())
-
-                    distance = compare_hashes(login_hash, registered_hash)
-                    if distance != -1 and distance <= SIMILARITY_THRESHOLD:
-                        st.success(f"✅ Welcome, {selected_user}!")
-                        profile = profile_manager.get_user_profile(selected_user)
-                        if profile:
-                            navigate_to_dashboard(profile)
-                    else:
-                        st.error("😕 Face not recognized. Try PIN instead.")
-                        st.session_state["show_pin_login"] = True
+                # 1:N match against every enrolled template, no profile picker needed.
+                matched_user, distance = identify(login_image_bytes.getvalue())
+                if matched_user:
+                    st.success(f"✅ Welcome, {matched_user}!")
+                    profile = profile_manager.get_user_profile(matched_user)
+                    if profile:
+                        navigate_to_dashboard(profile)
                 else:
-                    st.error("⚠️ No registered face found.")
+                    st.error("😕 Face not recognized. Try PIN instead.")
+                    st.session_state["show_pin_login"] = True
             else:
                 st.warning("📸 Please capture your face before unlocking.")
 
         # PIN Fallback
-        if st.session_state.get("show_pin_login", False) and selected_user:
+        if st.session_state.get("show_pin_login", False):
+            selected_user = st.selectbox("Choose your profile", registered_users)
             pin_input = st.text_input("Enter your 4-digit PIN", type="password")
-            if st.button("🔑 Unlock with PIN", use_container_width=True):
+            if selected_user and st.button("🔑 Unlock with PIN", use_container_width=True):
                 if profile_manager.verify_user_pin(selected_user, pin_input):
                     st.success("✅ PIN correct!")
                     profile = profile_manager.get_user_profile(selected_user)
@@ -129,8 +133,10 @@ with tab2:
                 if success:
                     user_dir = os.path.join(USER_IMAGES_DIR, new_username)
                     os.makedirs(user_dir, exist_ok=True)
-                    img = Image.open(io.BytesIO(register_image_bytes.getvalue()))
+                    image_bytes = register_image_bytes.getvalue()
+                    img = Image.open(io.BytesIO(image_bytes))
                     img.save(os.path.join(user_dir, REGISTERED_IMAGE_NAME))
+                    enroll_face(new_username, image_bytes)
                     st.success("🎉 Profile created! You can now login.")
                 else:
                     st.error(f"❌ Failed: {message}")
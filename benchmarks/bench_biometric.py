@@ -0,0 +1,90 @@
+# benchmarks/bench_biometric.py
+"""
+Timings for the face login pipeline on synthetic webcam frames.
+
+    python -m benchmarks.bench_biometric hash     # exact vs fast hash path
+    python -m benchmarks.bench_biometric detect   # detect-and-crop stages
+
+The fast path's equivalence is checked by tests/test_image_hash.py.
+"""
+import os
+import sys
+import time
+
+from core.biometric_auth import (
+    REGISTERED_IMAGE_NAME,
+    USER_IMAGES_DIR,
+    _dhash,
+    _reduce_for_hash,
+    _stage,
+    compare_hashes,
+    crop_face,
+    face_detection_enabled,
+    get_image_hash,
+)
+from tests.image_fixtures import frame_corpus, synthetic_frame
+
+
+def bench_image_hash(resolutions=((640, 480), (1280, 720), (1920, 1080)), frames=30, images_dir=USER_IMAGES_DIR):
+    """
+    Per-frame cost of the exact and fast hash paths, and the largest Hamming
+    distance between them, on synthetic webcam frames plus any registered
+    photos. Returns that largest distance.
+    """
+    corpus = frame_corpus(resolutions, frames)
+    registered = []
+    if os.path.isdir(images_dir):
+        for username in sorted(os.listdir(images_dir)):
+            image_path = os.path.join(images_dir, username, REGISTERED_IMAGE_NAME)
+            if os.path.exists(image_path):
+                with open(image_path, "rb") as f:
+                    registered.append(f.read())
+    if registered:
+        corpus.append(("registered", registered))
+
+    worst = 0
+    print(f"{'frames':>12} {'n':>4} {'exact ms':>9} {'fast ms':>8} {'max bits':>9} {'mean bits':>10}")
+    for label, frames_bytes in corpus:
+        timings = {}
+        hashes = {}
+        for fast in (False, True):
+            t0 = time.perf_counter()
+            hashes[fast] = [get_image_hash(data, fast=fast) for data in frames_bytes]
+            timings[fast] = (time.perf_counter() - t0) / len(frames_bytes) * 1e3
+        dists = [compare_hashes(a, b) for a, b in zip(hashes[False], hashes[True])]
+        worst = max(worst, max(dists))
+        print(f"{label:>12} {len(frames_bytes):>4} {timings[False]:>9.2f} {timings[True]:>8.2f}"
+              f" {max(dists):>9} {sum(dists) / len(dists):>10.2f}")
+    return worst
+
+
+def bench_face_detect(widths=(160, 320, 640), resolutions=((640, 480), (1280, 720), (1920, 1080)), frames=10):
+    """Mean per-stage milliseconds of the detect-and-crop pipeline at each detection width."""
+    if not face_detection_enabled():
+        print("Face detection unavailable (opencv-python not installed or FACE_DETECT=0).")
+        return
+    print(f"{'frames':>10} {'width':>6} {'decode':>7} {'detect':>7} {'crop':>6} {'hash':>6}")
+    for w, h in resolutions:
+        corpus = [synthetic_frame(w, h, seed) for seed in range(frames)]
+        for width in widths:
+            totals = {}
+            for data in corpus:
+                timings = {}
+                face = crop_face(data, timings, detect_width=width)
+                started = time.perf_counter()
+                _dhash(_reduce_for_hash(face).convert("L"))
+                _stage(timings, "hash_ms", started)
+                for name, ms in timings.items():
+                    totals[name] = totals.get(name, 0.0) + ms / len(corpus)
+            print(f"{w}x{h:<5} {width:>6} {totals['decode_ms']:>7.2f} {totals['detect_ms']:>7.2f}"
+                  f" {totals.get('crop_ms', 0.0):>6.2f} {totals['hash_ms']:>6.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "hash":
+        bench_image_hash()
+    elif len(sys.argv) >= 2 and sys.argv[1] == "detect":
+        bench_face_detect()
+    else:
+        print("usage: python -m benchmarks.bench_biometric hash | detect")
+        sys.exit(1)
@@ -0,0 +1,54 @@
+# benchmarks/bench_hamming_index.py
+"""
+MultiIndexHash radius queries against a brute-force NumPy scan of the same
+random 64-bit templates. FACE_INDEX_MIN_ENROLLMENT sits at the break-even.
+
+    python -m benchmarks.bench_hamming_index [size ...]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from core.hamming_index import MultiIndexHash, popcount64
+
+
+def bench_hamming_index(sizes=(100_000, 250_000, 1_000_000, 2_000_000), radius=10, queries=200, chunks=4):
+    rng = random.Random(42)
+    print(f"radius={radius} chunks={chunks} queries={queries}")
+    print(f"{'templates':>10} {'brute us/q':>11} {'index us/q':>11} {'touched':>8} {'agree':>6}")
+    for n in sizes:
+        values = [rng.getrandbits(64) for _ in range(n)]
+        index = MultiIndexHash.from_items(enumerate(values), chunks=chunks)
+        matrix = np.array(values, dtype=np.uint64)
+
+        # Half the queries are perturbed copies of enrolled templates (true
+        # matches), the other half are random faces that match nobody.
+        qs = []
+        for i in range(queries):
+            if i % 2 == 0:
+                v = values[rng.randrange(n)]
+                for bit in rng.sample(range(64), rng.randint(0, radius)):
+                    v ^= 1 << bit
+                qs.append(v)
+            else:
+                qs.append(rng.getrandbits(64))
+
+        t0 = time.perf_counter()
+        brute = []
+        for q in qs:
+            d = popcount64(matrix ^ np.uint64(q))
+            brute.append(sorted(int(i) for i in np.flatnonzero(d <= radius)))
+        t_brute = (time.perf_counter() - t0) / queries * 1e6
+
+        t0 = time.perf_counter()
+        hits = [sorted(k for k, _ in index.radius_query(q, radius)) for q in qs]
+        t_index = (time.perf_counter() - t0) / queries * 1e6
+
+        touched = sum(len(np.unique(index.candidates(q, radius))) for q in qs) / queries / n
+        print(f"{n:>10} {t_brute:>11.1f} {t_index:>11.1f} {touched:>7.2%} {str(brute == hits):>6}")
+
+
+if __name__ == "__main__":
+    bench_hamming_index(*([tuple(int(n) for n in sys.argv[1:])] if len(sys.argv) > 1 else []))
@@ -0,0 +1,106 @@
+# benchmarks/bench_parse_intent.py
+"""
+parse_intent() against the original keyword-by-keyword parser: checks that
+both agree on a command corpus and prints commands per second for each.
+
+    python -m benchmarks.bench_parse_intent [rounds]
+"""
+import re
+import time
+from typing import Dict, List
+
+from core.assistant import _GREETING_PHRASES, _GREETING_WORDS_RE, parse_due_datetime, parse_intent
+
+
+def _parse_intent_scan(text: str, available_apps: List[str]) -> Dict:
+    """The original keyword-by-keyword parser (greetings as whole words), the reference for bench_parse_intent()."""
+    if not text:
+        return {"action": "unknown"}
+    t = text.strip().lower()
+    if _GREETING_WORDS_RE.search(t) or any(g in t for g in _GREETING_PHRASES):
+        return {"action": "greet"}
+    if any(w in t for w in ["open ", "launch ", "start "]):
+        for app in available_apps:
+            if app.lower() in t:
+                return {"action": "open_app", "app": app}
+    if "most used" in t or "what did i do most" in t or "usage" in t:
+        return {"action": "most_used"}
+    if "streak" in t:
+        return {"action": "streak"}
+    if "show reminders" in t or "my reminders" in t or "list reminders" in t:
+        return {"action": "list_reminders"}
+    if "remind me" in t or t.startswith("remind "):
+        m = re.search(r"remind (?:me )?(?:to )?(.*)", t)
+        task = m.group(1) if m else None
+        return {"action": "add_reminder", "task": task or "something", "due": parse_due_datetime(t)}
+    if "time" in t and ("what" in t or "current" in t):
+        return {"action": "get_time"}
+    if "date" in t or "day is it" in t:
+        return {"action": "get_date"}
+    if "joke" in t:
+        return {"action": "joke"}
+    if "who created you" in t or "what are you" in t or "who are you" in t:
+        return {"action": "about"}
+    if "help" in t or "what can you do" in t:
+        return {"action": "help"}
+    return {"action": "unknown"}
+
+
+BENCH_APPS = ["Notes", "Gallery", "Games", "Music", "Camera", "Calendar", "News", "Study", "YouTube", "Books"]
+BENCH_COMMANDS = [
+    "Open Notes", "launch gallery please", "Start music", "open the camera app", "open something",
+    "What's my most used app?", "show my usage", "Show my streak", "Show reminders", "list reminders",
+    "Remind me to study tomorrow 7pm", "remind call mom in 20 minutes", "remind me at 5:30 pm to stretch",
+    "What time is it?", "current time", "What's today's date?", "what day is it",
+    "Tell me a joke", "who created you", "What can you do?", "help",
+    "hello", "Hey there", "good evening!", "how r u", "this is a test", "play something relaxing",
+    "I need to finish the quarterly report before the deadline on friday",
+    "", "   ", "Could you open Calendar and tell me what is coming up this week?",
+]
+BENCH_LONG_COMMANDS = [
+    "please schedule a meeting with the design team about the new onboarding flow next week",
+    "I was wondering whether you could figure out which of my apps I spent the most time in lately",
+    "remind me to send the signed lease back to the landlord and copy the agent on it tomorrow at 9",
+    "can you launch the gallery so I can find the pictures from the beach trip last summer",
+    "my sister keeps asking about the recipe for the lemon cake we baked on saturday afternoon",
+    "tell me something funny because the quarterly planning session completely drained me today",
+]
+
+
+def bench_parse_intent(rounds: int = 2000, apps=None) -> int:
+    """
+    Commands per second of parse_intent() against the keyword-scan reference,
+    on typical short commands and on long ones. Returns how many commands
+    parse differently (ignoring the clock-dependent reminder due time).
+    """
+    apps = BENCH_APPS if apps is None else apps
+    corpora = (("short", BENCH_COMMANDS), ("long", BENCH_LONG_COMMANDS))
+
+    def strip_due(intent):
+        return {k: v for k, v in intent.items() if k != "due"}
+
+    mismatches = 0
+    for command in BENCH_COMMANDS + BENCH_LONG_COMMANDS:
+        ours, reference = parse_intent(command, apps), _parse_intent_scan(command, apps)
+        if strip_due(ours) != strip_due(reference):
+            print(f"MISMATCH {command!r}: {ours} != {reference}")
+            mismatches += 1
+
+    print(f"{'corpus':>7} {'parser':>9} {'commands/s':>12} {'µs/command':>11}")
+    for corpus_name, commands in corpora:
+        for label, parse in (("scan", _parse_intent_scan), ("current", parse_intent)):
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                for command in commands:
+                    parse(command, apps)
+            elapsed = time.perf_counter() - t0
+            n = rounds * len(commands)
+            print(f"{corpus_name:>7} {label:>9} {n / elapsed:>12,.0f} {elapsed / n * 1e6:>11.2f}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    # python -m benchmarks.bench_parse_intent [rounds]
+    import sys
+
+    sys.exit(0 if bench_parse_intent(*(int(a) for a in sys.argv[1:2])) == 0 else 1)
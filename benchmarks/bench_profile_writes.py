@@ -0,0 +1,60 @@
+# benchmarks/bench_profile_writes.py
+"""
+Committed profile updates per second with N threads doing compare-and-swap
+read-modify-write on one user, and on one user each, in a scratch directory.
+
+    python -m benchmarks.bench_profile_writes [writes per thread]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import core.profile_manager as pm
+
+
+def _bump(profile):
+    profile["clicks"] = profile.get("clicks", 0) + 1
+
+
+def _run(threads, writes, shared):
+    users = ["shared"] if shared else [f"user{i}" for i in range(threads)]
+    for username in users:
+        pm.create_user_profile(username, 30, "0000")
+
+    def worker(i):
+        username = users[0] if shared else users[i]
+        for _ in range(writes):
+            pm.update_profile_with(username, _bump, retries=10_000)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    before = pm.get_profile_conflict_stats()
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    after = pm.get_profile_conflict_stats()
+    total = sum(pm.get_user_profile(u).get("clicks", 0) for u in users)
+    return total, elapsed, after["retries"] - before["retries"]
+
+
+def bench_profile_writes(writes=200, thread_counts=(1, 2, 4, 8, 16)):
+    print(f"{'threads':>7} {'users':>7} {'writes/s':>9} {'retries':>8} {'lost':>5}")
+    for threads in thread_counts:
+        for shared in (True, False):
+            with tempfile.TemporaryDirectory() as tmp:
+                pm.PROFILES_DIR = tmp
+                pm.PROFILE_INDEX_PATH = os.path.join(tmp, "profile_index.json")
+                pm._index = None
+                pm._history.clear()
+                total, elapsed, retries = _run(threads, writes, shared)
+                pm._flush_index_at_exit()
+            expected = threads * writes
+            print(f"{threads:>7} {'one' if shared else 'own':>7} {total / elapsed:>9,.0f} {retries:>8} {expected - total:>5}")
+
+
+if __name__ == "__main__":
+    bench_profile_writes(*(int(a) for a in sys.argv[1:2]))
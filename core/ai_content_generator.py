@@ -1,37 +1,65 @@
 # core/ai_content_generator.py
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-from dotenv import load_dotenv
-load_dotenv()
-
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
 
 # --- AI Initialization ---
-# This automatically uses the credentials from your service_account_key.json
-try:
-    vertexai.init(project="ai-os-469408", location="us-central1")
-    print("Vertex AI initialized successfully!")
-except Exception as e:
-    print(f"Vertex AI initialization failed: {e}")
+# The shared client initializes Vertex AI lazily, on the first request.
+from .llm_cache import TwoLevelCache
+from .model_client import ModelError, get_client
 
-# Load the Gemini Pro model
-model = GenerativeModel("gemini-1.0-pro")
+# --- Briefing Cache ---
+# The briefing depends only on the age bracket, so each (bracket, date, model)
+# is generated once, with a placeholder where the name goes, and shared by
+# every user (see core/llm_cache.py). A background job builds the day's
+# briefings ahead of logins. On a miss, one background stream per
+# (bracket, day) generates the briefing; every session, rerun and the
+# prewarm job read that same stream, and it runs to completion and fills
+# the cache even when the session that started it stops reading. A failed
+# generation stays registered, so readers get the fallback text at once, and
+# is only retried after a backoff that doubles with each consecutive failure.
+NAME_PLACEHOLDER = "[[NAME]]"
+BRIEFING_TTL = 2 * 24 * 3600
+AGE_BRACKETS = ("child", "teen", "adult")
+BRIEFING_RETRY_DELAY = 30.0
+BRIEFING_RETRY_MAX_DELAY = 30 * 60.0
+FALLBACK_BRIEFING = "Sorry, I'm having trouble connecting to the AI at the moment. Please try again later."
 
-def generate_personalized_content(profile):
-    """
-    Generates a personalized briefing for the user using the Gemini API.
-    """
-    if not profile or "age" not in profile:
-        return "Could not generate content. User profile is incomplete."
+_briefing_cache = None
+_briefing_lock = threading.Lock()
+_prewarm_thread = None
+_briefing_streams: Dict[str, "_BriefingStream"] = {}
+
+
+def _get_briefing_cache():
+    global _briefing_cache
+    with _briefing_lock:
+        if _briefing_cache is None:
+            _briefing_cache = TwoLevelCache(ttl=BRIEFING_TTL, table="briefing_cache")
+        return _briefing_cache
+
+
+def age_bracket(age) -> str:
+    age = int(age)
+    if age < 13:
+        return "child"
+    if age < 18:
+        return "teen"
+    return "adult"
+
+
+def _briefing_key(bracket: str, day: date) -> str:
+    return f"briefing:{bracket}:{day.isoformat()}"
+
+
+def _briefing_prompt(bracket: str) -> str:
+    username = NAME_PLACEHOLDER
 
-    username = profile.get("username", "User")
-    age = profile.get("age", 18)
-    
     # --- Prompt Engineering ---
     # We create a different prompt based on the user's age.
     prompt = ""
-    if age < 13: # For Children
+    if bracket == "child": # For Children
         prompt = f"""
         You are a fun and friendly AI assistant for a kid's operating system.
         Your user's name is {username}.
@@ -42,7 +70,7 @@ def generate_personalized_content(profile):
         
         Make it cheerful and use emojis!
         """
-    elif 13 <= age < 18: # For Teenagers
+    elif bracket == "teen": # For Teenagers
         prompt = f"""
         You are a cool and helpful AI assistant for a teenager's operating system.
         Your user's name is {username}.
@@ -64,14 +92,204 @@ def generate_personalized_content(profile):
         
         Keep the tone sharp and informative.
         """
+    return prompt + f"        Whenever you use their name, write it exactly as {NAME_PLACEHOLDER}.\n"
+
+
+class _BriefingStream:
+    """One in-flight briefing generation, drained by its own thread and readable by any number of sessions."""
+
+    def __init__(self, key: str, prompt: str, failures: int = 0):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[ModelError] = None
+        self.failures = failures  # consecutive failed generations before this one
+        self.retry_at = 0.0
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, args=(prompt,), name="briefing-stream", daemon=True).start()
+
+    def _run(self, prompt: str):
+        client = get_client()
+        try:
+            for chunk in client.stream(prompt):
+                with self._cond:
+                    self.chunks.append(chunk)
+                    self._cond.notify_all()
+            template = "".join(self.chunks)
+            if template.strip():
+                _get_briefing_cache().put(self.key, client.cache_name, template)
+        except ModelError as e:
+            # Finished streams stay registered for the day (a caller may have just missed
+            # the cache); failed ones until their retry time.
+            self.failures += 1
+            self.retry_at = time.monotonic() + min(BRIEFING_RETRY_MAX_DELAY,
+                                                   BRIEFING_RETRY_DELAY * 2 ** (self.failures - 1))
+            self.error = e
+        finally:
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def __iter__(self) -> Iterator[str]:
+        """Every chunk so far, then new ones as they arrive. Raises ModelError if generation failed."""
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                new, done = self.chunks[sent:], self.done
+            sent += len(new)
+            yield from new
+            if done and sent == len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+    def result(self) -> str:
+        return "".join(self)
+
+
+def _briefing_stream(bracket: str, day: date) -> "_BriefingStream":
+    """
+    The generation for (bracket, day): the in-flight or finished one, a failed
+    one until its retry time, otherwise a new one.
+    """
+    key = _briefing_key(bracket, day)
+    with _briefing_lock:
+        for old_key in [k for k in _briefing_streams if not k.endswith(day.isoformat())]:
+            del _briefing_streams[old_key]
+        stream = _briefing_streams.get(key)
+        if stream is None or (stream.done and stream.error is not None and time.monotonic() >= stream.retry_at):
+            failures = stream.failures if stream is not None else 0
+            stream = _briefing_streams[key] = _BriefingStream(key, _briefing_prompt(bracket), failures)
+        return stream
+
+
+def get_briefing_template(bracket: str, day: Optional[date] = None) -> str:
+    """The day's briefing for an age bracket, with NAME_PLACEHOLDER for the name. Raises ModelError."""
+    day = day or date.today()
+    template = _get_briefing_cache().get(_briefing_key(bracket, day), get_client().cache_name)
+    if template is None:
+        template = _briefing_stream(bracket, day).result()
+    return template
+
+
+def prewarm_briefings(day: Optional[date] = None) -> List[str]:
+    """Generate any of the day's briefings not cached yet. Returns the brackets that failed."""
+    failed = []
+    for bracket in AGE_BRACKETS:
+        try:
+            get_briefing_template(bracket, day)
+        except ModelError as e:
+            print(f"Briefing prewarm failed for {bracket}: {e}")
+            failed.append(bracket)
+    return failed
+
+
+def _prewarm_loop():
+    while True:
+        failed = prewarm_briefings()
+        now = datetime.now()
+        if failed:
+            wake = now + timedelta(minutes=5)
+        else:
+            # Just after midnight, so the new day's briefings exist before the first login.
+            wake = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) + timedelta(minutes=1)
+        time.sleep(max(1.0, (wake - now).total_seconds()))
+
+
+def start_briefing_prewarm():
+    """Start the once-per-process background job that keeps the day's briefings cached."""
+    global _prewarm_thread
+    with _briefing_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target=_prewarm_loop, name="briefing-prewarm", daemon=True)
+            _prewarm_thread.start()
+
+
+def generate_personalized_content(profile):
+    """
+    Generates a personalized briefing for the user using the Gemini API.
+    """
+    if not profile or "age" not in profile:
+        return "Could not generate content. User profile is incomplete."
+
+    username = profile.get("username", "User")
+    age = profile.get("age", 18)
+
+    try:
+        # Cached per age bracket and day; normally built by the prewarm job
+        template = get_briefing_template(age_bracket(age))
+    except ModelError as e:
+        print(f"Detailed Gemini Error: {e}")
+        return FALLBACK_BRIEFING
+    return template.replace(NAME_PLACEHOLDER, username)
+
+
+def _fill_name(chunks: Iterator[str], username: str) -> Iterator[str]:
+    """Replace NAME_PLACEHOLDER in a chunk stream, even when it is split across chunks."""
+    pending = ""
+    for chunk in chunks:
+        pending = (pending + chunk).replace(NAME_PLACEHOLDER, username)
+        # Hold back a tail that could be the start of a placeholder.
+        keep = next((k for k in range(min(len(pending), len(NAME_PLACEHOLDER) - 1), 0, -1)
+                     if NAME_PLACEHOLDER.startswith(pending[-k:])), 0)
+        if len(pending) > keep:
+            yield pending[:len(pending) - keep]
+            pending = pending[len(pending) - keep:]
+    if pending:
+        yield pending
+
+
+def cached_personalized_content(profile) -> Optional[str]:
+    """
+    The briefing if it is already cached, or FALLBACK_BRIEFING when no model
+    can produce it right now; never waits. None means a generation is in
+    flight (started here on a miss) and can be read with
+    stream_personalized_content().
+    """
+    if not profile or "age" not in profile:
+        return "Could not generate content. User profile is incomplete."
+
+    bracket = age_bracket(profile.get("age", 18))
+    day = date.today()
+    client = get_client()
+    template = _get_briefing_cache().get(_briefing_key(bracket, day), client.cache_name)
+    if template is not None:
+        return template.replace(NAME_PLACEHOLDER, profile.get("username", "User"))
+    if not client.available():
+        return FALLBACK_BRIEFING
+    stream = _briefing_stream(bracket, day)
+    if stream.done and stream.error is not None:
+        return FALLBACK_BRIEFING
+    return None
+
+
+def stream_personalized_content(profile) -> Iterator[str]:
+    """
+    Streaming generate_personalized_content(): yields the briefing in chunks
+    as the model writes it. A cached briefing arrives as one chunk.
+    """
+    if not profile or "age" not in profile:
+        yield "Could not generate content. User profile is incomplete."
+        return
+
+    username = profile.get("username", "User")
+    bracket = age_bracket(profile.get("age", 18))
+    day = date.today()
+    client = get_client()
+    cache = _get_briefing_cache()
+    template = cache.get(_briefing_key(bracket, day), client.cache_name)
+    if template is not None:
+        yield template.replace(NAME_PLACEHOLDER, username)
+        return
 
     try:
-        # Send the prompt to the Gemini model
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
+        # Shared with other sessions and the prewarm job; keeps going if this rerun is abandoned.
+        yield from _fill_name(iter(_briefing_stream(bracket, day)), username)
+    except ModelError as e:
         print(f"Detailed Gemini Error: {e}")
-        return "Sorry, I'm having trouble connecting to the AI at the moment. Please try again later."
+        yield FALLBACK_BRIEFING
 # ----------------------------
 # SMART SUGGESTIONS
 # ----------------------------
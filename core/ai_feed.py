@@ -1,42 +1,137 @@
 # core/ai_feed.py
 from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
-# Optional: natural-language polish via VertexAI (graceful fallback if unavailable)
-_USE_VERTEX = True
-_model = None
+from .llm_cache import TwoLevelCache
+from .model_client import ModelError, get_client
+from .reminder_store import due_key, upcoming_in
 
-def _maybe_init_vertex() -> None:
-    global _model
-    if _model is not None:
-        return
-    if not _USE_VERTEX:
-        return
-    try:
-        from dotenv import load_dotenv
-        load_dotenv()
-        import vertexai
-        from vertexai.generative_models import GenerativeModel
+# Optional: natural-language polish via the shared model client (graceful fallback if unavailable)
+_USE_MODEL = True
+
+# All card polishes for one render go out as one batched request bounded by
+# one deadline (seconds); if it is not back in time the cards keep their raw text.
+FEED_POLISH_DEADLINE = float(os.environ.get("FEED_POLISH_DEADLINE", "1.5"))
+FEED_POLISH_WORKERS = int(os.environ.get("FEED_POLISH_WORKERS", "8"))
+_polish_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Most card texts are constants, so polished text is cached across users,
+# reruns and restarts (see core/llm_cache.py).
+_polish_cache: Optional[TwoLevelCache] = None
+
+# Finished feeds keyed by feed_fingerprint(); a rerun with unchanged inputs
+# (e.g. typing in the assistant box) reuses the cards without any work. A
+# feed rendered raw because no model was usable is kept too, but only until
+# the model could be tried again (the breaker's or init retry's reset time).
+FEED_MEMO_SIZE = int(os.environ.get("FEED_MEMO_SIZE", "128"))
+_feed_memo: "OrderedDict[str, Tuple[List[Dict[str, str]], float]]" = OrderedDict()  # key -> (cards, expires_at)
+_feed_memo_lock = threading.Lock()
 
-        # vertexai.init(project="YOUR_PROJECT_ID", location="us-central1")  # optional
-        _model = GenerativeModel("gemini-1.0-pro")
-    except Exception:
-        _model = None
+
+def _get_polish_cache() -> TwoLevelCache:
+    global _polish_cache
+    with _pool_lock:
+        if _polish_cache is None:
+            _polish_cache = TwoLevelCache()
+        return _polish_cache
 
 
 def _nlp_polish(text: str) -> str:
-    """Optionally send to Gemini for a crisper phrasing."""
-    _maybe_init_vertex()
-    if _model is None:
-        return text
+    """Optionally send to Gemini for a crisper phrasing (a one-card _polish_batch())."""
+    cached = _get_polish_cache().get(text, get_client().cache_name)
+    if cached is not None:
+        return cached
+    return (_polish_batch({"0": text}) or {}).get("0", text)
+
+
+_POLISH_INSTRUCTION = "Rewrite the following as a friendly, concise feed card (keep emojis if present):"
+
+
+def _get_polish_pool() -> ThreadPoolExecutor:
+    global _polish_pool
+    with _pool_lock:
+        if _polish_pool is None:
+            _polish_pool = ThreadPoolExecutor(max_workers=FEED_POLISH_WORKERS, thread_name_prefix="feed-polish")
+        return _polish_pool
+
+
+def _polish_batch(texts: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Polish every text in one model call; per-text fallback to the raw input. None without a model."""
+    client = get_client()
+    if not client.available():
+        return None
     try:
-        resp = _model.generate_content(
-            f"Rewrite the following as a friendly, concise feed card (keep emojis if present):\n\n{text}"
-        )
-        return (resp.text or "").strip() or text
-    except Exception:
-        return text
+        results = client.generate_batch(_POLISH_INSTRUCTION, texts)
+    except ModelError:
+        return None
+    cache = _get_polish_cache()
+    for card_id, polished in results.items():
+        if polished != texts[card_id]:
+            cache.put(texts[card_id], client.cache_name, polished)
+    return results
+
+
+def _iter_polished(cards: List[Dict[str, str]], deadline: float):
+    """
+    Yield (position, card) for every card at once, with cached bodies filled
+    in, then yield each card again as the batched polish of the remaining
+    bodies comes back. Bodies not back within `deadline` seconds stay raw.
+    Returns True when no card was left raw by a missed deadline or a bad reply.
+    """
+    started = time.monotonic()
+    misses = {}
+    if _USE_MODEL:
+        cache = _get_polish_cache()
+        model_name = get_client().cache_name
+        for i, card in enumerate(cards):
+            cached = cache.get(card["body"], model_name)
+            if cached is not None:
+                card["body"] = cached
+            else:
+                misses[str(i)] = card["body"]
+    for i, card in enumerate(cards):
+        yield i, dict(card)
+    if not misses:
+        return True
+    future = _get_polish_pool().submit(_polish_batch, misses)
+    done, _ = wait([future], timeout=max(0.0, deadline - (time.monotonic() - started)))
+    if not done:
+        # Leave the request running: its results still land in the cache for the next render.
+        return False
+    results = future.result()
+    if results is None:
+        # No model right now (e.g. the breaker is open): not final, the next render retries.
+        return False
+    complete = True
+    for card_id, polished in results.items():
+        if polished == misses[card_id]:
+            complete = False
+            continue
+        cards[int(card_id)]["body"] = polished
+        yield int(card_id), dict(cards[int(card_id)])
+    return complete
+
+
+def feed_fingerprint(profile: dict, now: Optional[datetime] = None) -> str:
+    """Hash of everything the feed reads: usage, streak, last app, reminders, age and the hour."""
+    now = now or datetime.now()
+    state = {
+        "usage_counts": profile.get("usage_counts") or {},
+        "streak": profile.get("streak") or {},
+        "last_opened_app": profile.get("last_opened_app"),
+        "reminders": [(r.get("id"), r.get("text"), r.get("due")) for r in profile.get("reminders") or []],
+        "age": int(profile.get("age", 18)),
+        "hour": now.strftime("%Y-%m-%d %H"),
+    }
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode("utf-8")).hexdigest()
 
 
 def _format_time(dt: datetime) -> str:
@@ -49,11 +144,57 @@ def _pick_top_app(usage_counts: Dict[str, int]) -> Optional[str]:
     return max(usage_counts, key=usage_counts.get)
 
 
-def generate_feed_cards(profile: dict) -> List[Dict[str, str]]:
+def generate_feed_cards(profile: dict, deadline: Optional[float] = None) -> List[Dict[str, str]]:
     """
     Returns a list of feed 'cards'.
     Each card is: { 'icon': '📌', 'title': '...', 'body': '...' }
+    Returns within about `deadline` seconds (default FEED_POLISH_DEADLINE).
     """
+    cards: Dict[int, Dict[str, str]] = {}
+    for position, card in iter_feed_cards(profile, deadline):
+        cards[position] = card
+    return [cards[i] for i in sorted(cards)]
+
+
+def iter_feed_cards(profile: dict, deadline: Optional[float] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Yields (position, card) as cards become ready: every card right away
+    (polished if cached, raw otherwise), then a card again at the same
+    position when its polished text arrives. Feeds whose inputs have not
+    changed since the last complete render come straight from memory.
+    """
+    now = datetime.now()
+    key = feed_fingerprint(profile, now)
+    memo = None
+    with _feed_memo_lock:
+        entry = _feed_memo.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del _feed_memo[key]
+        elif entry is not None:
+            _feed_memo.move_to_end(key)
+            memo = entry[0]
+    if memo is not None:
+        for i, card in enumerate(memo):
+            yield i, dict(card)
+        return
+
+    cards = _build_cards(profile, now)
+    complete = yield from _iter_polished(cards, FEED_POLISH_DEADLINE if deadline is None else deadline)
+    if complete:
+        expires_at = float("inf")
+    else:
+        retry_in = get_client().unavailable_for() if _USE_MODEL else 0.0
+        if not retry_in:
+            return
+        expires_at = time.monotonic() + retry_in
+    with _feed_memo_lock:
+        _feed_memo[key] = ([dict(card) for card in cards], expires_at)
+        while len(_feed_memo) > FEED_MEMO_SIZE:
+            _feed_memo.popitem(last=False)
+
+
+def _build_cards(profile: dict, now: datetime) -> List[Dict[str, str]]:
+    """The feed's cards with their raw, unpolished bodies."""
     cards: List[Dict[str, str]] = []
 
     username = profile.get("username", "User")
@@ -64,24 +205,24 @@ def generate_feed_cards(profile: dict) -> List[Dict[str, str]]:
     reminders: List[dict] = profile.get("reminders", []) or []
 
     # --- 1) Time-of-day ---
-    hour = datetime.now().hour
+    hour = now.hour
     if 6 <= hour < 12:
         cards.append({
             "icon": "🌅",
             "title": "Good morning!",
-            "body": _nlp_polish("Start strong: jot a quick plan in Notes or review a reminder.")
+            "body": "Start strong: jot a quick plan in Notes or review a reminder."
         })
     elif 12 <= hour < 18:
         cards.append({
             "icon": "🌤️",
             "title": "Good afternoon!",
-            "body": _nlp_polish("Take a short focus sprint. Capture ideas in Notes or enjoy a mindful break.")
+            "body": "Take a short focus sprint. Capture ideas in Notes or enjoy a mindful break."
         })
     else:
         cards.append({
             "icon": "🌙",
             "title": "Good evening!",
-            "body": _nlp_polish("Wind down gently. Review your day in Notes or set a reminder for tomorrow.")
+            "body": "Wind down gently. Review your day in Notes or set a reminder for tomorrow."
         })
 
     # --- 2) Usage spotlight ---
@@ -91,13 +232,13 @@ def generate_feed_cards(profile: dict) -> List[Dict[str, str]]:
         cards.append({
             "icon": "📊",
             "title": "Your activity spotlight",
-            "body": _nlp_polish(f"You’ve opened **{top_app}** {count} time(s). Keep momentum or try something new!")
+            "body": f"You’ve opened **{top_app}** {count} time(s). Keep momentum or try something new!"
         })
     else:
         cards.append({
             "icon": "✨",
             "title": "Try something",
-            "body": _nlp_polish("No usage yet. Tap an app to get started — Notes, Gallery, or Games.")
+            "body": "No usage yet. Tap an app to get started — Notes, Gallery, or Games."
         })
 
     # --- 3) Streak nudges ---
@@ -107,31 +248,18 @@ def generate_feed_cards(profile: dict) -> List[Dict[str, str]]:
         cards.append({
             "icon": "🔥",
             "title": "Streak on!",
-            "body": _nlp_polish(f"You’re on a **{s_len}×** streak with **{s_app}**. Want to keep it going?")
+            "body": f"You’re on a **{s_len}×** streak with **{s_app}**. Want to keep it going?"
         })
 
     # --- 4) Upcoming reminders ---
-    now = datetime.now()
-    upcoming = []
-    for r in reminders:
-        try:
-            when_iso = r.get("when_iso")
-            if not when_iso:
-                continue
-            when = datetime.fromisoformat(when_iso)
-            if when >= now:
-                upcoming.append((when, r.get("text", "Reminder")))
-        except Exception:
-            continue
-
-    upcoming.sort(key=lambda x: x[0])
-    if upcoming:
-        top = upcoming[:2]
-        body_lines = [f"• **{txt}** — { _format_time(when) }" for when, txt in top]
+    # profile["reminders"] comes from the reminder store already sorted by due.
+    top = upcoming_in(reminders, now, 2)
+    if top:
+        body_lines = [f"• **{r.get('text', 'Reminder')}** — { _format_time(due_key(r['due'])) }" for r in top]
         cards.append({
             "icon": "⏰",
             "title": "Upcoming reminders",
-            "body": _nlp_polish("\n".join(body_lines))
+            "body": "\n".join(body_lines)
         })
 
     # --- 5) Age-aware guidance ---
@@ -139,34 +267,34 @@ def generate_feed_cards(profile: dict) -> List[Dict[str, str]]:
         cards.append({
             "icon": "🎨",
             "title": "Creative spark",
-            "body": _nlp_polish("Draw something fun in Notes — maybe a **space robot** or **dancing tiger**!")
+            "body": "Draw something fun in Notes — maybe a **space robot** or **dancing tiger**!"
         })
         cards.append({
             "icon": "🛡️",
             "title": "Stay safe",
-            "body": _nlp_polish("Always check with a parent before sharing info online.")
+            "body": "Always check with a parent before sharing info online."
         })
     elif 13 <= age < 18:
         cards.append({
             "icon": "📚",
             "title": "Study reminder",
-            "body": _nlp_polish("Review today’s lessons for at least 20 minutes to stay sharp.")
+            "body": "Review today’s lessons for at least 20 minutes to stay sharp."
         })
         cards.append({
             "icon": "🎧",
             "title": "Take a break",
-            "body": _nlp_polish("Music or a short walk can help you recharge your focus.")
+            "body": "Music or a short walk can help you recharge your focus."
         })
     else:
         cards.append({
             "icon": "💼",
             "title": "Productivity tip",
-            "body": _nlp_polish("Try 25-minute focus sessions with 5-minute breaks for better productivity.")
+            "body": "Try 25-minute focus sessions with 5-minute breaks for better productivity."
         })
         cards.append({
             "icon": "🌿",
             "title": "Digital detox",
-            "body": _nlp_polish("Step away from screens for a short walk to refresh your mind.")
+            "body": "Step away from screens for a short walk to refresh your mind."
         })
 
     # --- 6) Balance nudge ---
@@ -178,7 +306,7 @@ def generate_feed_cards(profile: dict) -> List[Dict[str, str]]:
                 cards.append({
                     "icon": "🧘",
                     "title": "Balance nudge",
-                    "body": _nlp_polish(f"You’ve spent a lot of time in **{mostly}**. A 2-minute pause can reset your focus.")
+                    "body": f"You’ve spent a lot of time in **{mostly}**. A 2-minute pause can reset your focus."
                 })
 
     # --- 7) Last opened continuity ---
@@ -186,7 +314,7 @@ def generate_feed_cards(profile: dict) -> List[Dict[str, str]]:
         cards.append({
             "icon": "🔁",
             "title": "Continue where you left off",
-            "body": _nlp_polish(f"Last opened: **{last_opened}**. Want to jump back in?")
+            "body": f"Last opened: **{last_opened}**. Want to jump back in?"
         })
 
     return cards
@@ -1,6 +1,11 @@
 # core/assistant.py
+import os
 import re
 import random
+import threading
+import time
+from bisect import insort
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
@@ -9,8 +14,11 @@ from .profile_manager import (
     get_user_profile,
     update_user_profile,
     ensure_profile_defaults,
-    add_reminder,
+    append_reminder,
 )
+from .reminder_store import due_key
+from .model_client import ModelError, get_client
+from .vertex_client import VERTEX_CLIENT_MODEL
 
 # --- Greeting state (to reduce repetition) ---
 _last_greeting: Optional[str] = None
@@ -18,6 +26,22 @@ _greet_count: int = 0
 
 
 # -------- Intent Parsing --------
+# Greetings are checked first. Single-word greetings must be whole words
+# ("hi" is not a greeting inside "this" or "which", nor "yo" inside "you"),
+# or open-ended questions would never reach the model fallback; the longer
+# phrases are plain substrings.
+_GREETING_WORDS_RE = re.compile(r"\b(?:hello|hi|hey|yo|sup)\b")
+_GREETING_PHRASES = (
+    "what's up", "whats up",
+    "good morning", "good evening", "good afternoon",
+    "how are you", "how r u", "how ru", "how r you",
+)
+
+_REMIND_TASK_RE = re.compile(r"remind (?:me )?(?:to )?(.*)")
+_IN_DELTA_RE = re.compile(r"in\s+(\d+)\s+(minute|minutes|hour|hours)")
+_AT_TIME_RE = re.compile(r"at\s+(\d{1,2})(?::(\d{2}))?\s*(am|pm)?")
+
+
 def parse_intent(text: str, available_apps: List[str]) -> Dict:
     """
     Parse a user command into an intent dictionary.
@@ -32,12 +56,7 @@ def parse_intent(text: str, available_apps: List[str]) -> Dict:
     t = text.strip().lower()
 
     # greetings
-    greetings = [
-        "hello", "hi", "hey", "yo", "sup", "what's up", "whats up",
-        "good morning", "good evening", "good afternoon",
-        "how are you", "how r u", "how ru", "how r you"
-    ]
-    if any(g in t for g in greetings):
+    if _GREETING_WORDS_RE.search(t) or any(g in t for g in _GREETING_PHRASES):
         return {"action": "greet"}
 
     # open app
@@ -61,7 +80,7 @@ def parse_intent(text: str, available_apps: List[str]) -> Dict:
     # add reminder
     if "remind me" in t or t.startswith("remind "):
         task = None
-        m = re.search(r"remind (?:me )?(?:to )?(.*)", t)
+        m = _REMIND_TASK_RE.search(t)
         if m:
             task = m.group(1)
         due = parse_due_datetime(t)
@@ -102,7 +121,7 @@ def parse_due_datetime(text: str) -> datetime:
         base = now.replace(second=0, microsecond=0)
         return parse_time_of_day(text, default=base + timedelta(hours=1))
 
-    m = re.search(r"in\s+(\d+)\s+(minute|minutes|hour|hours)", text)
+    m = _IN_DELTA_RE.search(text)
     if m:
         qty = int(m.group(1))
         unit = m.group(2)
@@ -121,7 +140,7 @@ def parse_due_datetime(text: str) -> datetime:
 def parse_time_of_day(text: str, default: Optional[datetime]) -> Optional[datetime]:
     """Parse explicit time from text (e.g., 'at 5pm')."""
     now = datetime.now()
-    m = re.search(r"at\s+(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", text)
+    m = _AT_TIME_RE.search(text)
     if not m:
         return default
 
@@ -140,16 +159,61 @@ def parse_time_of_day(text: str, default: Optional[datetime]) -> Optional[dateti
 
 
 # -------- Intent Handling --------
-def handle_intent(username: str, available_apps: List[str], intent: Dict, original_text: str) -> Tuple[str, Optional[str]]:
+# Intents that read the user's profile; everything else is answered without it.
+PROFILE_INTENTS = frozenset({"most_used", "streak", "list_reminders"})
+
+
+class AssistantContext:
+    """
+    The user an intent is handled for. The profile is the caller's in-memory
+    copy (e.g. the Dashboard's session profile) when given, and is otherwise
+    read from disk on first use, so intents that never touch it cost no I/O.
+    """
+
+    def __init__(self, username: str, profile: Optional[dict] = None):
+        self.username = username
+        self._profile = profile
+
+    @property
+    def profile_loaded(self) -> bool:
+        return self._profile is not None
+
+    @property
+    def profile(self) -> dict:
+        if self._profile is None:
+            self._profile = get_user_profile(self.username) or {}
+        return ensure_profile_defaults(self._profile)
+
+    @property
+    def guest(self) -> bool:
+        return bool(self._profile and self._profile.get("guest_mode"))
+
+    def add_reminder(self, text: str, due_iso: Optional[str]) -> dict:
+        """Append one reminder to the store and, if the profile is in memory, to its sorted list."""
+        if self.guest:
+            reminder = {"id": None, "text": text, "due": due_iso, "created_at": datetime.now().isoformat()}
+        else:
+            reminder = append_reminder(self.username, text, due_iso)
+        if self._profile is not None:
+            reminders = self._profile.setdefault("reminders", [])
+            insort(reminders, reminder, key=lambda r: due_key(r.get("due")))
+        return reminder
+
+
+def handle_intent(username: str, available_apps: List[str], intent: Dict, original_text: str,
+                  context: Optional[AssistantContext] = None) -> Tuple[str, Optional[str]]:
     """
     Handle the parsed intent and return:
         (assistant_reply, app_to_open or None)
+    Pass `context` to reuse a profile already in memory; only the intents
+    in PROFILE_INTENTS read it.
     """
-    profile = ensure_profile_defaults(get_user_profile(username) or {})
-    usage = profile.get("usage_counts", {})
-    streak = profile.get("streak", {"app": None, "len": 0})
-
+    context = context or AssistantContext(username)
     action = intent.get("action")
+    if action in PROFILE_INTENTS:
+        profile = context.profile
+        usage = profile.get("usage_counts", {})
+        streak = profile.get("streak", {"app": None, "len": 0})
 
     if action == "open_app":
         app = intent.get("app")
@@ -175,15 +239,15 @@ def handle_intent(username: str, available_apps: List[str], intent: Dict, origin
         reminders = profile.get("reminders", [])
         if not reminders:
             return "No reminders set.", None
-        sorted_rem = sorted(reminders, key=lambda r: r.get("due", ""))
-        lines = [f"- {r['text']} ({format_human_time(r.get('due'))})" for r in sorted_rem[:5]]
+        # Already sorted by due time by the reminder store.
+        lines = [f"- {r['text']} ({format_human_time(r.get('due'))})" for r in reminders[:5]]
         return "Reminders:\n" + "\n".join(lines), None
 
     if action == "add_reminder":
         task = (intent.get("task") or "something").strip()
         due_dt = intent.get("due")
         due_iso = due_dt.isoformat() if isinstance(due_dt, datetime) else None
-        add_reminder(username, task, due_iso)
+        context.add_reminder(task, due_iso)
         return f"Reminder added ✅ {task} ({format_human_time(due_iso)})", None
 
     if action == "get_time":
@@ -259,7 +323,7 @@ def handle_intent(username: str, available_apps: List[str], intent: Dict, origin
         return reply, None
 
     # --- Fallback ---
-    return "Sorry, didn’t get that. Try **help**.", None
+    return UNKNOWN_REPLY, None
 
 
 def format_human_time(iso: Optional[str]) -> str:
@@ -271,3 +335,96 @@ def format_human_time(iso: Optional[str]) -> str:
         return dt.strftime("%a, %b %d at %I:%M %p")
     except Exception:
         return iso
+
+
+# -------- Model Fallback --------
+# Commands parse_intent() does not recognize are sent to the model in the
+# background. The caller shows THINKING_REPLY at once and swaps in the answer
+# when it arrives; after ASSISTANT_MODEL_TIMEOUT seconds it gives up.
+ASSISTANT_MODEL_FALLBACK = os.environ.get("ASSISTANT_MODEL_FALLBACK", "1") != "0"
+ASSISTANT_MODEL_TIMEOUT = float(os.environ.get("ASSISTANT_MODEL_TIMEOUT", "6"))
+ASSISTANT_MODEL_WORKERS = int(os.environ.get("ASSISTANT_MODEL_WORKERS", "4"))
+UNKNOWN_REPLY = "Sorry, didn’t get that. Try **help**."
+THINKING_REPLY = "🤔 Thinking…"
+TIMEOUT_REPLY = "Sorry, that took too long to answer. Try again, or type **help**."
+
+_model_pool: Optional[ThreadPoolExecutor] = None
+_model_pool_lock = threading.Lock()
+
+
+def _get_model_pool() -> ThreadPoolExecutor:
+    global _model_pool
+    with _model_pool_lock:
+        if _model_pool is None:
+            _model_pool = ThreadPoolExecutor(max_workers=ASSISTANT_MODEL_WORKERS, thread_name_prefix="assistant-model")
+        return _model_pool
+
+
+def _model_prompt(text: str, context: Optional[AssistantContext]) -> str:
+    audience = "a user"
+    # Only an age already in memory is used; the profile is not loaded for this.
+    if context is not None and context.profile_loaded:
+        age = int(context.profile.get("age", 18))
+        audience = "a child" if age < 13 else "a teenager" if age < 18 else "an adult"
+    return (
+        f"You are the friendly assistant built into a personal launcher app, talking to {audience}. "
+        "Answer the message below in at most three short sentences of plain text.\n\n"
+        f"{text.strip()}"
+    )
+
+
+def _ask_model(prompt: str) -> str:
+    """Runs on the model pool; "" (shown as UNKNOWN_REPLY) when no model can be used."""
+    # available() may run the first backend initialization, so it stays off the request thread.
+    if not get_client().available():
+        return ""
+    try:
+        return get_client().generate(prompt, VERTEX_CLIENT_MODEL).strip()
+    except ModelError as e:
+        print(f"Assistant model fallback failed: {e}")
+        return ""
+
+
+class PendingReply:
+    """A model answer to one command, being generated in the background."""
+
+    def __init__(self, future: Future, timeout: float = ASSISTANT_MODEL_TIMEOUT):
+        self._future = future
+        self._deadline = time.monotonic() + timeout
+
+    def result(self, wait: float = 0.0) -> Optional[str]:
+        """
+        The final reply text, waiting up to `wait` seconds for it; None while
+        the answer may still arrive. Past the deadline this is TIMEOUT_REPLY.
+        """
+        remaining = self._deadline - time.monotonic()
+        try:
+            text = self._future.result(timeout=max(0.0, min(wait, remaining)))
+        except FutureTimeout:
+            return None if remaining > wait else TIMEOUT_REPLY
+        return text or UNKNOWN_REPLY
+
+
+def ask_model_async(text: str, context: Optional[AssistantContext] = None) -> Optional[PendingReply]:
+    """Start a model answer for `text`; None when the model fallback is switched off."""
+    if not ASSISTANT_MODEL_FALLBACK:
+        return None
+    return PendingReply(_get_model_pool().submit(_ask_model, _model_prompt(text, context)))
+
+
+def resolve_command(username: str, available_apps: List[str], text: str,
+                    context: Optional[AssistantContext] = None) -> Tuple[str, Optional[str], Optional[PendingReply]]:
+    """
+    Tiered handling of one command: parse_intent() answers everything it
+    recognizes, synchronously. Only an unknown command goes to the model, in
+    the background; the reply is then THINKING_REPLY plus a PendingReply to
+    poll for the real one.
+    Returns (assistant_reply, app_to_open or None, pending or None).
+    """
+    intent = parse_intent(text, available_apps)
+    if intent["action"] == "unknown" and text.strip():
+        pending = ask_model_async(text, context)
+        if pending is not None:
+            return THINKING_REPLY, None, pending
+    reply, app_to_open = handle_intent(username, available_apps, intent, text, context=context)
+    return reply, app_to_open, None
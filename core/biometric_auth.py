@@ -2,59 +2,578 @@
 
 from PIL import Image
 import io
+import json
+import os
+import sys
+import threading
+import time
 
-def get_image_hash(image_bytes):
+import numpy as np
+
+from .fileio import atomic_write, atomic_write_json, file_signature
+from .hamming_index import MultiIndexHash, popcount64
+
+ASSETS_DIR = "assets"
+USER_IMAGES_DIR = os.path.join(ASSETS_DIR, "user_images")
+REGISTERED_IMAGE_NAME = "registered_face.png"
+# Precomputed hash of the registered face, stored next to the image so login
+# never has to decode the registration photo again.
+TEMPLATE_FILE_NAME = "face_template.txt"
+# Template of the detected face crop, used while face detection is available.
+FACE_TEMPLATE_FILE_NAME = "face_template_crop.txt"
+
+HASH_BITS = 64
+SIMILARITY_THRESHOLD = 10  # Lower = stricter matching
+# Above this many enrolled users, best_match queries the multi-index hash
+# instead of scanning every template. The vectorized scan is faster below
+# about 250k templates (see `python -m benchmarks.bench_hamming_index`).
+FACE_INDEX_MIN_ENROLLMENT = int(os.environ.get("FACE_INDEX_MIN_ENROLLMENT", "250000"))
+
+# "hash" (default) matches 64-bit difference hashes; "deepface" matches CPU
+# face embeddings and needs the optional deepface package.
+FACE_BACKEND = os.environ.get("FACE_BACKEND", "hash")
+EMBEDDING_MODEL = os.environ.get("FACE_EMBEDDING_MODEL", "Facenet")
+EMBEDDING_THRESHOLD = float(os.environ.get("FACE_EMBEDDING_THRESHOLD", "0.40"))  # max cosine distance
+# Unit-normalized float32 vectors, one row per user, plus a JSON id map.
+EMBEDDINGS_PATH = os.path.join(ASSETS_DIR, "face_embeddings.f32")
+EMBEDDING_IDS_PATH = os.path.join(ASSETS_DIR, "face_embeddings.json")
+
+
+# Face detection (needs opencv-python). The Haar cascade scans a copy of the
+# frame reduced to about FACE_DETECT_WIDTH pixels wide; the box is scaled
+# back and the face is cropped from the full-resolution frame.
+FACE_DETECT = os.environ.get("FACE_DETECT", "1") != "0"
+FACE_DETECT_WIDTH = int(os.environ.get("FACE_DETECT_WIDTH", "320"))
+FACE_CROP_MARGIN = 0.2  # widen the detected box by this fraction on each side
+
+# Decode (JPEG draft mode) or box-reduce frames to about this many times the
+# 9x8 hash size before the final LANCZOS resize. The hash changes by at most
+# a bit or two, well inside SIMILARITY_THRESHOLD.
+FAST_DECODE_FACTOR = 8
+
+
+# Modes Image.reduce() accepts; anything else (palette, 1-bit, I;16 PNGs) is
+# converted to grayscale first.
+_REDUCE_MODES = frozenset({"L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "I", "F"})
+
+
+def _reduce(image, factor):
+    if factor <= 1:
+        return image
+    if image.mode not in _REDUCE_MODES:
+        image = image.convert("L")
+    return image.reduce(factor)
+
+
+def _reduce_for_hash(image):
+    """Integer box reduce to about FAST_DECODE_FACTOR times the hash size."""
+    factor = min(image.width // (9 * FAST_DECODE_FACTOR), image.height // (8 * FAST_DECODE_FACTOR))
+    return _reduce(image, factor)
+
+
+def _load_grayscale(image_bytes, fast=True):
+    """Decode to grayscale, skipping the resolution the 9x8 hash never uses when `fast`."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if fast:
+        # JPEG: libjpeg decodes straight to grayscale at 1/2, 1/4 or 1/8 scale.
+        image.draft("L", (9 * FAST_DECODE_FACTOR, 8 * FAST_DECODE_FACTOR))
+        # Anything still much larger (PNG, or a JPEG above 8x the target):
+        # cheap integer box reduce before the expensive filters.
+        image = _reduce_for_hash(image)
+    return image.convert("L")
+
+
+def _dhash(grayscale_image):
+    # Resize to a tiny 9x8 image, then one bit per left > right neighbour pair
+    resized_image = grayscale_image.resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = np.frombuffer(resized_image.tobytes(), dtype=np.uint8).reshape(8, 9)
+    bits = pixels[:, :-1] > pixels[:, 1:]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def get_image_hash(image_bytes, fast=True):
     """
     Generates a perceptual hash for an image.
     
     Args:
         image_bytes: The image file in bytes (from st.camera_input).
+        fast: Decode at reduced resolution first (see FAST_DECODE_FACTOR).
+            Pass False for the exact full-resolution hash.
 
     Returns:
-        A 64-character hash string.
+        A 64-bit difference hash as an int (first comparison in the most
+        significant bit, so it equals int(old_bit_string, 2)).
     """
     if image_bytes is None:
         return None
-    
-    # Open the image using Pillow
+    return _dhash(_load_grayscale(image_bytes, fast))
+
+
+# -------- Face detection --------
+# cv2.CascadeClassifier keeps per-call state and is not safe to call from
+# several threads at once, so each thread (Streamlit session) gets its own.
+_face_cascade_path = None  # None: not checked yet, False: OpenCV or its cascade is unavailable
+_face_cascade_lock = threading.Lock()
+_face_cascade_local = threading.local()
+
+
+def _cascade_path():
+    global _face_cascade_path
+    with _face_cascade_lock:
+        if _face_cascade_path is None:
+            _face_cascade_path = False
+            if FACE_DETECT:
+                try:
+                    import cv2
+
+                    path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+                    if not cv2.CascadeClassifier(path).empty():
+                        _face_cascade_path = path
+                except (ImportError, AttributeError):
+                    pass
+        return _face_cascade_path or None
+
+
+def _load_face_cascade():
+    """This thread's face cascade, or None when detection is unavailable."""
+    path = _cascade_path()
+    if path is None:
+        return None
+    cascade = getattr(_face_cascade_local, "cascade", None)
+    if cascade is None:
+        import cv2
+
+        cascade = _face_cascade_local.cascade = cv2.CascadeClassifier(path)
+    return cascade
+
+
+def face_detection_enabled():
+    """True when frames are cropped to the face before matching."""
+    return _cascade_path() is not None
+
+
+def detect_face(image, detect_width=None):
+    """Largest face in a PIL image as a (left, top, right, bottom) box, or None."""
+    cascade = _load_face_cascade()
+    if cascade is None:
+        return None
+    width = detect_width or FACE_DETECT_WIDTH
+    small = _reduce(image, max(1, image.width // width)).convert("L")
+    if small.width > width:
+        # A draft-decoded JPEG can land between 1x and 2x the detection width.
+        small = small.resize((width, max(1, small.height * width // small.width)), Image.Resampling.BILINEAR)
+    faces = cascade.detectMultiScale(np.asarray(small), scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    sx, sy = image.width / small.width, image.height / small.height
+    mx, my = w * FACE_CROP_MARGIN, h * FACE_CROP_MARGIN
+    return (max(0, int((x - mx) * sx)), max(0, int((y - my) * sy)),
+            min(image.width, int((x + w + mx) * sx)), min(image.height, int((y + h + my) * sy)))
+
+
+def _stage(timings, name, started):
+    """Record the milliseconds since `started` under `name`; returns the new start time."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[name] = (now - started) * 1e3
+    return now
+
+
+def crop_face(image_bytes, timings=None, detect_width=None):
+    """
+    Decode a frame and crop it to the detected face. Falls back to the whole
+    frame when no face is found or detection is unavailable. JPEGs are
+    draft-decoded to grayscale at the smallest scale still at least the
+    detection width, so detection and the crop both skip the full decode.
+    """
+    started = time.perf_counter()
     image = Image.open(io.BytesIO(image_bytes))
-    
-    # 1. Convert to grayscale
-    grayscale_image = image.convert("L")
-    
-    # 2. Resize to a tiny 9x8 image
-    resized_image = grayscale_image.resize((9, 8), Image.Resampling.LANCZOS)
-    
-    # 3. Calculate the difference hash
-    hash_string = ""
-    pixels = list(resized_image.getdata())
-    
-    for row in range(8):
-        for col in range(8):
-            left_pixel = pixels[row * 9 + col]
-            right_pixel = pixels[row * 9 + col + 1]
-            if left_pixel > right_pixel:
-                hash_string += "1"
-            else:
-                hash_string += "0"
-                
-    return hash_string
+    width = detect_width or FACE_DETECT_WIDTH
+    image.draft("L", (width, max(1, image.height * width // image.width)))
+    image.load()
+    started = _stage(timings, "decode_ms", started)
+    box = detect_face(image, detect_width)
+    started = _stage(timings, "detect_ms", started)
+    if box is None:
+        return image
+    face = image.crop(box)
+    _stage(timings, "crop_ms", started)
+    return face
+
+
+def get_face_hash(image_bytes, timings=None):
+    """Difference hash of the face in a frame: the crop when detection is available, else the whole frame."""
+    if image_bytes is None:
+        return None
+    if not face_detection_enabled():
+        started = time.perf_counter()
+        face_hash = get_image_hash(image_bytes)
+        _stage(timings, "hash_ms", started)
+        return face_hash
+    face = crop_face(image_bytes, timings)
+    started = time.perf_counter()
+    face_hash = _dhash(_reduce_for_hash(face).convert("L"))
+    _stage(timings, "hash_ms", started)
+    return face_hash
+
+
+def _template_file_name():
+    # Whole-frame and face-crop hashes are not comparable, so each has its own file.
+    return FACE_TEMPLATE_FILE_NAME if face_detection_enabled() else TEMPLATE_FILE_NAME
+
+def hash_to_int(face_hash):
+    """Accept an int hash, a 16-char hex string, or a legacy 64-char "0"/"1" string."""
+    if face_hash is None:
+        return None
+    if isinstance(face_hash, (int, np.integer)):
+        return int(face_hash)
+    face_hash = face_hash.strip()
+    try:
+        if len(face_hash) == HASH_BITS and set(face_hash) <= {"0", "1"}:
+            return int(face_hash, 2)
+        return int(face_hash, 16)
+    except ValueError:
+        return None
 
 def compare_hashes(hash1, hash2):
     """
     Compares two image hashes and returns the similarity score.
     
     Args:
-        hash1: The first hash string.
-        hash2: The second hash string.
+        hash1: The first hash (int, or a stored string form).
+        hash2: The second hash.
 
     Returns:
         An integer representing the number of different bits (Hamming distance).
         A lower number means more similar.
     """
-    if not hash1 or not hash2 or len(hash1) != len(hash2):
+    h1, h2 = hash_to_int(hash1), hash_to_int(hash2)
+    if h1 is None or h2 is None:
         return -1 # Indicate an error
 
     # Calculate the Hamming distance
-    distance = sum(bit1 != bit2 for bit1, bit2 in zip(hash1, hash2))
-    return distance
\ No newline at end of file
+    return (h1 ^ h2).bit_count()
+
+class FaceTemplateMatrix:
+    """
+    All enrolled templates as one contiguous uint64 array, so 1:N matching is
+    a single XOR + popcount over every user instead of a Python loop. The
+    array is owned by a MultiIndexHash, which answers radius queries
+    without the full scan once enrollment is large.
+    """
+
+    def __init__(self, templates=(), index_min_enrollment=None):
+        self._index = MultiIndexHash.from_items(
+            [(username, hash_to_int(face_hash)) for username, face_hash in templates], bits=HASH_BITS
+        )
+        self.index_min_enrollment = (FACE_INDEX_MIN_ENROLLMENT if index_min_enrollment is None
+                                     else index_min_enrollment)
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def usernames(self):
+        return self._index.keys
+
+    @property
+    def hashes(self):
+        return self._index.values
+
+    def add(self, username, face_hash):
+        self._index.insert(username, hash_to_int(face_hash))
+
+    def remove(self, username):
+        self._index.delete(username)
+
+    def distances(self, face_hash):
+        return popcount64(self.hashes ^ np.uint64(hash_to_int(face_hash)))
+
+    def best_match(self, face_hash, threshold=SIMILARITY_THRESHOLD):
+        """Return (username, distance) of the closest template within threshold, else (None, None)."""
+        if not len(self):
+            return None, None
+        if len(self) >= self.index_min_enrollment:
+            matches = self._index.radius_query(hash_to_int(face_hash), threshold)
+            return matches[0] if matches else (None, None)
+        dists = self.distances(face_hash)
+        row = int(np.argmin(dists))
+        distance = int(dists[row])
+        if distance > threshold:
+            return None, None
+        return self.usernames[row], distance
+
+
+# Shared by every session in the process; built lazily from the template files.
+_enrolled = None
+_enrolled_lock = threading.RLock()
+
+
+def _enrolled_templates(images_dir=USER_IMAGES_DIR):
+    global _enrolled
+    with _enrolled_lock:
+        if _enrolled is None:
+            backfill_face_templates(images_dir)
+            templates = []
+            if os.path.isdir(images_dir):
+                for username in sorted(os.listdir(images_dir)):
+                    face_hash = load_face_template(username, images_dir)
+                    if face_hash is not None:
+                        templates.append((username, face_hash))
+            _enrolled = FaceTemplateMatrix(templates)
+        return _enrolled
+
+
+def identify(image_bytes, threshold=None, timings=None):
+    """
+    Match a camera frame against every enrolled user at once.
+    Returns (username, distance) for the best match within threshold, else
+    (None, None). The distance is a bit count for the hash backend and a
+    cosine distance for the embedding backend. Pass a dict as `timings` to
+    get per-stage milliseconds (decode, detect, crop, hash/embed, match).
+    """
+    if FACE_BACKEND == "deepface":
+        store = _enrolled_embeddings()
+        vector = get_face_embedding(image_bytes, timings)
+        started = time.perf_counter()
+        match = store.best_match(vector, EMBEDDING_THRESHOLD if threshold is None else threshold)
+        _stage(timings, "match_ms", started)
+        return match
+    if threshold is None:
+        threshold = SIMILARITY_THRESHOLD
+    matrix = _enrolled_templates()
+    face_hash = get_face_hash(image_bytes, timings)
+    if face_hash is None:
+        return None, None
+    started = time.perf_counter()
+    with _enrolled_lock:
+        match = matrix.best_match(face_hash, threshold)
+    _stage(timings, "match_ms", started)
+    return match
+
+# -------- Embedding backend --------
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def _load_embedding_model():
+    """Build the embedding model once per process; later calls reuse it."""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            from deepface import DeepFace
+
+            DeepFace.build_model(EMBEDDING_MODEL)  # DeepFace caches built models by name
+            _embedding_model = DeepFace
+        return _embedding_model
+
+
+def get_face_embedding(image_bytes, timings=None):
+    """Unit-length float32 embedding of the face in `image_bytes`, or None."""
+    if image_bytes is None:
+        return None
+    deepface = _load_embedding_model()
+    face = crop_face(image_bytes, timings)
+    started = time.perf_counter()
+    rgb = np.asarray(face.convert("RGB"))
+    result = deepface.represent(
+        img_path=np.ascontiguousarray(rgb[:, :, ::-1]),  # DeepFace expects BGR arrays
+        model_name=EMBEDDING_MODEL,
+        detector_backend="skip",
+        enforce_detection=False,
+    )
+    vector = np.asarray(result[0]["embedding"], dtype=np.float32)
+    _stage(timings, "embed_ms", started)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else None
+
+
+class FaceEmbeddingStore:
+    """
+    Enrolled embeddings in a contiguous float32 file read through np.memmap,
+    with a sidecar JSON map from row to username. Vectors are stored
+    unit-length, so a login is one matrix-vector product.
+    """
+
+    def __init__(self, vectors_path=EMBEDDINGS_PATH, ids_path=EMBEDDING_IDS_PATH, model=None):
+        self.vectors_path = vectors_path
+        self.ids_path = ids_path
+        # Embeddings of face crops and of whole frames are kept apart like hash templates.
+        self.model = model or (EMBEDDING_MODEL + ("+crop" if face_detection_enabled() else ""))
+        self.ids = []
+        self.dim = None
+        self._rows = {}
+        self._vectors = None
+        self._signature = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self.ids)
+
+    def _refresh(self):
+        signature = file_signature(self.ids_path)
+        if signature == self._signature:
+            return
+        ids, dim = [], None
+        if signature is not None:
+            with open(self.ids_path, "r") as f:
+                meta = json.load(f)
+            # Vectors from another model are not comparable; treat them as absent.
+            if meta.get("model") == self.model:
+                ids, dim = meta.get("ids", []), meta.get("dim")
+        vectors = None
+        if ids:
+            # Rows past len(ids) belong to an append whose id map never landed.
+            vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(ids), dim))
+        self.ids, self.dim, self._vectors = ids, dim, vectors
+        self._rows = {username: row for row, username in enumerate(ids)}
+        self._signature = signature
+
+    def _write_ids(self):
+        atomic_write_json(self.ids_path, {"model": self.model, "dim": self.dim, "ids": self.ids})
+
+    def add(self, username, vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        with self._lock:
+            self._refresh()
+            if self.dim is not None and vector.size != self.dim:
+                raise ValueError(f"expected a {self.dim}-d embedding, got {vector.size}")
+            row = self._rows.get(username)
+            if row is not None:
+                self._vectors = None  # drop the read-only map before writing the row
+                rows = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(len(self.ids), self.dim))
+                rows[row] = vector
+                rows.flush()
+                del rows
+            else:
+                os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+                with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                    f.seek(len(self.ids) * vector.size * 4)
+                    f.write(vector.tobytes())
+                    f.truncate()
+                self.ids = self.ids + [username]
+                self.dim = vector.size
+            self._write_ids()
+            self._signature = None
+            self._refresh()
+
+    def best_match(self, vector, max_distance=EMBEDDING_THRESHOLD):
+        """Return (username, cosine distance) of the closest embedding within max_distance, else (None, None)."""
+        with self._lock:
+            self._refresh()
+            if not self.ids or vector is None:
+                return None, None
+            scores = self._vectors @ np.asarray(vector, dtype=np.float32)
+            row = int(np.argmax(scores))
+            distance = 1.0 - float(scores[row])
+            if distance > max_distance:
+                return None, None
+            return self.ids[row], distance
+
+
+_embeddings = None
+
+
+def _enrolled_embeddings(images_dir=USER_IMAGES_DIR):
+    global _embeddings
+    with _enrolled_lock:
+        if _embeddings is None:
+            store = FaceEmbeddingStore()
+            backfill_face_embeddings(images_dir, store)
+            _embeddings = store
+        return _embeddings
+
+
+def warm_face_backend():
+    """Load the configured backend's model and templates on a background thread."""
+    target = _warm_embeddings if FACE_BACKEND == "deepface" else _enrolled_templates
+    threading.Thread(target=target, daemon=True).start()
+
+
+def _warm_embeddings():
+    _load_embedding_model()
+    _enrolled_embeddings()
+
+
+def save_face_template(username, face_hash, images_dir=USER_IMAGES_DIR):
+    """Store the registered face's hash for `username`."""
+    user_dir = os.path.join(images_dir, username)
+    os.makedirs(user_dir, exist_ok=True)
+    template = f"{hash_to_int(face_hash):016x}"
+    atomic_write(os.path.join(user_dir, _template_file_name()), lambda f: f.write(template))
+    if images_dir == USER_IMAGES_DIR:
+        with _enrolled_lock:
+            if _enrolled is not None:
+                _enrolled.add(username, face_hash)
+
+
+def load_face_template(username, images_dir=USER_IMAGES_DIR):
+    """Return the stored face hash for `username`, or None if there is none yet."""
+    try:
+        with open(os.path.join(images_dir, username, _template_file_name()), "r") as f:
+            return hash_to_int(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def enroll_face(username, image_bytes):
+    """Store every template the configured backend matches against for a new registration."""
+    save_face_template(username, get_face_hash(image_bytes))
+    if FACE_BACKEND == "deepface":
+        _enrolled_embeddings().add(username, get_face_embedding(image_bytes))
+
+
+def backfill_face_templates(images_dir=USER_IMAGES_DIR, force=False):
+    """
+    Generate templates for users registered before templates existed.
+    Returns the usernames that were (re)computed.
+    """
+    done = []
+    if not os.path.isdir(images_dir):
+        return done
+    for username in sorted(os.listdir(images_dir)):
+        image_path = os.path.join(images_dir, username, REGISTERED_IMAGE_NAME)
+        if not os.path.exists(image_path):
+            continue
+        if not force and load_face_template(username, images_dir) is not None:
+            continue
+        with open(image_path, "rb") as f:
+            save_face_template(username, get_face_hash(f.read()), images_dir)
+        done.append(username)
+    return done
+
+
+def backfill_face_embeddings(images_dir=USER_IMAGES_DIR, store=None):
+    """Compute embeddings for registered users missing from the embedding store."""
+    store = store or FaceEmbeddingStore()
+    done = []
+    if not os.path.isdir(images_dir):
+        return done
+    with store._lock:
+        store._refresh()
+        missing = [u for u in sorted(os.listdir(images_dir)) if u not in store._rows]
+    for username in missing:
+        image_path = os.path.join(images_dir, username, REGISTERED_IMAGE_NAME)
+        if not os.path.exists(image_path):
+            continue
+        with open(image_path, "rb") as f:
+            vector = get_face_embedding(f.read())
+        if vector is not None:
+            store.add(username, vector)
+            done.append(username)
+    return done
+
+
+if __name__ == "__main__":
+    # python -m core.biometric_auth backfill [--force]
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("usage: python -m core.biometric_auth backfill [--force]")
+        sys.exit(1)
+    users = backfill_face_templates(force="--force" in sys.argv[2:])
+    print(f"Wrote face templates for {len(users)} user(s): {', '.join(users) or '-'}")
+    if FACE_BACKEND == "deepface":
+        users = backfill_face_embeddings()
+        print(f"Wrote {EMBEDDING_MODEL} embeddings for {len(users)} user(s): {', '.join(users) or '-'}")
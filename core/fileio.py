@@ -0,0 +1,37 @@
+# core/fileio.py
+"""File helpers shared by the profile, reminder and face-template stores."""
+import json
+import os
+import threading
+
+
+def file_signature(path):
+    """(mtime_ns, size, inode) of `path`, or None if it does not exist; changes whenever the file does."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def atomic_write(path, write, mode="w"):
+    """
+    Call `write(f)` on a temp file next to `path`, fsync it and rename it over
+    `path`, so readers never see a half-written file. The temp name is unique
+    per process and thread, so concurrent writers never share one.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    atomic_write(path, lambda f: json.dump(data, f, **dump_kwargs))
@@ -0,0 +1,60 @@
+# core/llm_batch.py
+"""
+Batch several short model requests into one round trip.
+
+The items go out as one JSON object of {id: text} with an instruction to
+answer with a JSON object mapping the same ids to results. The reply is
+parsed leniently (code fences and chatter around the object are
+ignored) and every id that is missing, empty or not a string falls back
+to its input text, so one bad item or an unparsable reply never costs
+more than the polish itself.
+
+    results = batch_generate(generate, "Rewrite each as a friendly feed card.", {"0": "...", "1": "..."})
+
+`generate` is any callable taking a prompt string and returning the
+model's text.
+"""
+import json
+import re
+from typing import Callable, Dict
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def build_batch_prompt(instruction: str, items: Dict[str, str]) -> str:
+    return (
+        f"{instruction.strip()}\n\n"
+        "Apply this to every value in the JSON object below. Reply with only a JSON object "
+        "that has exactly the same keys, each mapped to its result as a string.\n\n"
+        f"{json.dumps(items, ensure_ascii=False, indent=1)}"
+    )
+
+
+def parse_batch_response(text: str, items: Dict[str, str]) -> Dict[str, str]:
+    """Map every id in `items` to its result from `text`, or to its input when unusable."""
+    parsed = {}
+    body = _FENCE.sub("", (text or "").strip())
+    start, end = body.find("{"), body.rfind("}")
+    if start != -1 and end > start:
+        try:
+            parsed = json.loads(body[start:end + 1])
+        except ValueError:
+            parsed = {}
+    if not isinstance(parsed, dict):
+        parsed = {}
+    results = {}
+    for item_id, raw in items.items():
+        value = parsed.get(item_id)
+        results[item_id] = value.strip() if isinstance(value, str) and value.strip() else raw
+    return results
+
+
+def batch_generate(generate: Callable[[str], str], instruction: str, items: Dict[str, str]) -> Dict[str, str]:
+    """One model call for all `items`; any failure falls back to the inputs."""
+    if not items:
+        return {}
+    try:
+        text = generate(build_batch_prompt(instruction, items))
+    except Exception:
+        return dict(items)
+    return parse_batch_response(text, items)
@@ -0,0 +1,169 @@
+# core/llm_cache.py
+"""
+Two-level cache for model output: an in-memory LRU in front of a SQLite
+table shared by every process on the machine.
+
+Entries are keyed by model name plus the input text with whitespace
+collapsed, so the same constant feed text polished for another user (or
+after a restart) is served without a model call. Entries expire after
+`ttl` seconds and the on-disk table is trimmed to `max_entries`, least
+recently used first. Each cache lives in its own table, so one cache's
+TTL and size limit never trim another's entries.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join("assets", "llm_cache.sqlite3"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MEMORY_SIZE = int(os.environ.get("LLM_CACHE_MEMORY_SIZE", "512"))
+
+# Trim the on-disk table after this many inserts rather than on every one.
+_TRIM_EVERY = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    key         TEXT PRIMARY KEY,
+    model       TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_{table}_accessed ON {table}(accessed_at);
+"""
+
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha1(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class TwoLevelCache:
+    def __init__(self, db_path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, memory_size: int = LLM_CACHE_MEMORY_SIZE,
+                 table: str = "llm_cache"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.db_path = db_path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inserts = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0}
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connect().executescript(SCHEMA.format(table=table))
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, as in core/sqlite_store.py."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, text: str, model: str) -> Optional[str]:
+        key = cache_key(text, model)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        conn = self._connect()
+        try:
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] + self.ttl <= now:
+                with conn:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                with self._lock:
+                    self._stats["expired"] += 1
+                row = None
+            if row is not None:
+                with conn:
+                    conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            row = None  # a locked or damaged cache only costs a model call
+        if row is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["disk_hits"] += 1
+        self._remember(key, row[0], row[1] + self.ttl)
+        return row[0]
+
+    def put(self, text: str, model: str, value: str):
+        key = cache_key(text, model)
+        now = time.time()
+        self._remember(key, value, now + self.ttl)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, model, value, created_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, model, value, now, now),
+                )
+        except sqlite3.Error:
+            return
+        with self._lock:
+            self._inserts += 1
+            trim = self._inserts % _TRIM_EVERY == 0
+        if trim:
+            self.trim()
+
+    def trim(self):
+        """Drop expired rows, then the least recently used ones beyond max_entries."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE created_at <= ?", (time.time() - self.ttl,))
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table}"
+                    " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        conn = self._connect()
+        with conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
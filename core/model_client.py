@@ -0,0 +1,544 @@
+# core/model_client.py
+"""
+One shared, lazily initialized client for every model call in the app.
+
+Nothing is imported or initialized until the first call, and then only
+once per process, so importing a page never waits on vertexai. The
+backend is chosen with MODEL_BACKEND:
+
+    vertex  Gemini through Vertex AI (VERTEX_PROJECT, VERTEX_LOCATION, MODEL_NAME)
+    stub    deterministic local replies, for offline runs and benchmarks
+            (MODEL_STUB_LATENCY adds a fixed delay per call, in seconds)
+
+    from core.model_client import get_client
+
+    client = get_client()
+    text = client.generate("Say hi")
+    text = await client.agenerate("Say hi")
+    for chunk in client.stream("Say hi"): ...
+    results = client.generate_batch("Rewrite each politely.", {"a": "...", "b": "..."})
+
+Every call records its time to first token and total time; see
+client.call_metrics() and client.latency_summary().
+
+Identical prompts for the same model that are in flight at the same time
+(e.g. many sessions polishing the same feed text) share one request; see
+client.singleflight_stats().
+
+Every request has a timeout (MODEL_CALL_TIMEOUT) and goes through a shared
+circuit breaker: once too many recent calls fail, calls fail fast with
+ModelError for MODEL_BREAKER_OPEN_SECONDS, then a single probe call
+decides whether to close it again. See client.breaker_stats().
+
+generate() raises ModelError when the backend is unavailable or the call
+fails; callers pick their own fallback text.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .llm_batch import batch_generate
+
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "vertex")
+MODEL_NAME = os.environ.get("MODEL_NAME", "gemini-1.0-pro")
+VERTEX_PROJECT = os.environ.get("VERTEX_PROJECT", "ai-os-469408")
+VERTEX_LOCATION = os.environ.get("VERTEX_LOCATION", "us-central1")
+MODEL_STUB_LATENCY = float(os.environ.get("MODEL_STUB_LATENCY", "0"))
+# After a failed initialization, wait this long (seconds) before trying again.
+INIT_RETRY_INTERVAL = 60.0
+# Per-call latency records kept for ModelClient.call_metrics().
+CALL_METRICS_SIZE = 512
+# Seconds a request (or the wait for the next streamed chunk) may take.
+MODEL_CALL_TIMEOUT = float(os.environ.get("MODEL_CALL_TIMEOUT", "10"))
+# Trip once at least MODEL_BREAKER_MIN_CALLS of the last MODEL_BREAKER_WINDOW
+# calls have been made and MODEL_BREAKER_FAILURE_RATE of them failed.
+MODEL_BREAKER_WINDOW = int(os.environ.get("MODEL_BREAKER_WINDOW", "20"))
+MODEL_BREAKER_MIN_CALLS = int(os.environ.get("MODEL_BREAKER_MIN_CALLS", "4"))
+MODEL_BREAKER_FAILURE_RATE = float(os.environ.get("MODEL_BREAKER_FAILURE_RATE", "0.5"))
+MODEL_BREAKER_OPEN_SECONDS = float(os.environ.get("MODEL_BREAKER_OPEN_SECONDS", "30"))
+# Threads running blocking backend calls; a call stuck past its timeout keeps its thread.
+MODEL_MAX_CONCURRENCY = int(os.environ.get("MODEL_MAX_CONCURRENCY", "16"))
+
+
+class ModelError(Exception):
+    pass
+
+
+class VertexBackend:
+    name = "vertex"
+
+    def __init__(self):
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        import vertexai
+        from vertexai.generative_models import GenerativeModel
+
+        vertexai.init(project=VERTEX_PROJECT, location=VERTEX_LOCATION)
+        self._model_class = GenerativeModel
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model_name):
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = self._model_class(model_name)
+            return model
+
+    def generate(self, prompt: str, model_name: str) -> str:
+        return self._model(model_name).generate_content(prompt).text or ""
+
+    async def agenerate(self, prompt: str, model_name: str) -> str:
+        response = await self._model(model_name).generate_content_async(prompt)
+        return response.text or ""
+
+    def stream(self, prompt: str, model_name: str) -> Iterator[str]:
+        for response in self._model(model_name).generate_content(prompt, stream=True):
+            if response.text:
+                yield response.text
+
+
+class StubBackend:
+    """Deterministic replies: the same prompt always gets the same text, with no network."""
+    name = "stub"
+
+    def _reply(self, prompt: str, model_name: str) -> str:
+        # Batched prompts (core/llm_batch.py) end with a JSON object of items.
+        start = prompt.find("{")
+        if start != -1:
+            try:
+                items = json.loads(prompt[start:])
+            except ValueError:
+                items = None
+            if isinstance(items, dict):
+                return json.dumps({k: f"✨ {v}" for k, v in items.items()}, ensure_ascii=False)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        body = prompt.strip().split("\n\n")[-1].strip()
+        return f"✨ {body} [{model_name}:{digest}]"
+
+    def generate(self, prompt: str, model_name: str) -> str:
+        if MODEL_STUB_LATENCY:
+            time.sleep(MODEL_STUB_LATENCY)
+        return self._reply(prompt, model_name)
+
+    def stream(self, prompt: str, model_name: str) -> Iterator[str]:
+        # Same text as generate(), a word at a time, with the latency spread across the words.
+        words = self._reply(prompt, model_name).split(" ")
+        for i, word in enumerate(words):
+            if MODEL_STUB_LATENCY:
+                time.sleep(MODEL_STUB_LATENCY / len(words))
+            yield word if i == len(words) - 1 else word + " "
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self._async_waiters = []  # (loop, future) pairs from agenerate() followers
+        self._lock = threading.Lock()
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            pending = not self.done.is_set()
+            if pending:
+                self._async_waiters.append((loop, future))
+        if pending:
+            await future  # set by resolve() from whichever thread the leader ran on
+        return self.wait()
+
+    def resolve(self, result, error):
+        with self._lock:
+            self.result, self.error = result, error
+            self.done.set()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+
+class SingleFlight:
+    """Per-process request coalescing: the first caller for a key runs the call, later ones wait for it."""
+
+    def __init__(self):
+        self._flights: Dict[tuple, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "deduplicated": 0}
+
+    def begin(self, key):
+        """Return (flight, True) if the caller must run the call, or (flight, False) to wait on it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats["deduplicated"] += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self._stats["leaders"] += 1
+            return flight, True
+
+    def finish(self, key, flight: _Flight, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.resolve(result, error)
+
+    def do(self, key, fn: Callable[[], object]):
+        flight, leader = self.begin(key)
+        if not leader:
+            return flight.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result=result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
+
+
+class CircuitBreaker:
+    """
+    closed: calls go through, outcomes are tracked over a sliding window.
+    open: calls are rejected at once until `open_seconds` have passed.
+    half_open: exactly one probe call goes through; success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(self, window: int = MODEL_BREAKER_WINDOW, min_calls: int = MODEL_BREAKER_MIN_CALLS,
+                 failure_rate: float = MODEL_BREAKER_FAILURE_RATE, open_seconds: float = MODEL_BREAKER_OPEN_SECONDS):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._outcomes = deque(maxlen=window)  # True = success
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {"trips": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. In half-open state only the first caller gets True."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state, self._probing = "half_open", False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (does not claim the half-open probe)."""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self._opened_at < self.open_seconds
+            return self.state == "half_open" and self._probing
+
+    def open_for(self) -> float:
+        """Seconds until an open breaker lets a probe through; 0 when it is not open."""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record(self, ok: bool):
+        with self._lock:
+            if self.state == "half_open":
+                if ok:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if (self.state == "closed" and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._trip()
+
+    def _trip(self):
+        self.state, self._opened_at, self._probing = "open", time.monotonic(), False
+        self._outcomes.clear()
+        self._stats["trips"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self.state
+            stats["recent_failures"] = self._outcomes.count(False)
+            stats["recent_calls"] = len(self._outcomes)
+        return stats
+
+
+_BACKENDS: Dict[str, Callable[[], object]] = {
+    "vertex": VertexBackend,
+    "stub": StubBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], object]):
+    """Make `factory` (returning an object with generate(prompt, model_name)) selectable by name."""
+    _BACKENDS[name] = factory
+
+
+class ModelClient:
+    def __init__(self, backend: str = MODEL_BACKEND, model_name: str = MODEL_NAME):
+        self.backend_name = backend
+        self.model_name = model_name
+        self._backend = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._metrics = deque(maxlen=CALL_METRICS_SIZE)
+        self._singleflight = SingleFlight()
+        self._breaker = CircuitBreaker()
+        self._pool = None
+
+    @property
+    def cache_name(self) -> str:
+        """Identifies who produced a reply, for keying caches of model output."""
+        return f"{self.backend_name}:{self.model_name}"
+
+    def _get_backend(self):
+        if self._backend is not None:
+            return self._backend
+        with self._lock:
+            if self._backend is None:
+                if self._failed_at is not None and time.monotonic() - self._failed_at < INIT_RETRY_INTERVAL:
+                    raise ModelError(f"model backend {self.backend_name!r} unavailable")
+                try:
+                    self._backend = _BACKENDS[self.backend_name]()
+                except Exception as e:
+                    self._failed_at = time.monotonic()
+                    raise ModelError(f"model backend {self.backend_name!r} failed to initialize: {e}") from e
+            return self._backend
+
+    def available(self) -> bool:
+        """Initialize the backend if needed; False if it cannot be used right now."""
+        if self._breaker.is_open():
+            return False
+        try:
+            self._get_backend()
+            return True
+        except ModelError:
+            return False
+
+    def unavailable_for(self) -> float:
+        """
+        Seconds until a model call could be tried again: the rest of an open
+        breaker or of the init retry interval. 0 when it may be tried now.
+        Never initializes the backend.
+        """
+        wait = self._breaker.open_for()
+        failed_at = self._failed_at
+        if self._backend is None and failed_at is not None:
+            wait = max(wait, INIT_RETRY_INTERVAL - (time.monotonic() - failed_at))
+        return max(0.0, wait)
+
+    # --- Fault handling ---
+    def _admit(self):
+        """Fail fast while the breaker is open; otherwise return the initialized backend."""
+        if not self._breaker.allow():
+            raise ModelError(f"model backend {self.backend_name!r} is failing; circuit open")
+        try:
+            return self._get_backend()
+        except ModelError:
+            self._breaker.record(False)
+            raise
+
+    def _call_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=MODEL_MAX_CONCURRENCY, thread_name_prefix="model-call")
+            return self._pool
+
+    def _with_timeout(self, fn, *args):
+        future = self._call_pool().submit(fn, *args)
+        try:
+            return future.result(timeout=MODEL_CALL_TIMEOUT)
+        except FutureTimeout:
+            future.cancel()
+            raise TimeoutError(f"no reply within {MODEL_CALL_TIMEOUT:g}s") from None
+
+    def _chunks_with_timeout(self, chunks: Iterator[str]) -> Iterator[str]:
+        """Pump a blocking chunk iterator on the call pool; each chunk must arrive within the timeout."""
+        pipe: "queue.Queue" = queue.Queue()
+        done = object()
+
+        def pump():
+            try:
+                for chunk in chunks:
+                    pipe.put((chunk, None))
+                pipe.put((done, None))
+            except BaseException as e:
+                pipe.put((None, e))
+
+        self._call_pool().submit(pump)
+        while True:
+            try:
+                chunk, error = pipe.get(timeout=MODEL_CALL_TIMEOUT)
+            except queue.Empty:
+                raise TimeoutError(f"no chunk within {MODEL_CALL_TIMEOUT:g}s") from None
+            if error is not None:
+                raise error
+            if chunk is done:
+                return
+            yield chunk
+
+    def breaker_stats(self) -> dict:
+        """state (closed / open / half_open), trips, calls rejected while open, recent failures."""
+        return self._breaker.stats()
+
+    # --- Metrics ---
+    def _record(self, kind: str, model_name: str, started: float, first_chunk_at: Optional[float], ok: bool):
+        ended = time.perf_counter()
+        # Without streaming the first token arrives with the whole reply.
+        first_chunk_at = first_chunk_at or ended
+        self._metrics.append({  # deque.append is atomic
+            "kind": kind,
+            "model": model_name,
+            "ok": ok,
+            "ttft_ms": (first_chunk_at - started) * 1e3,
+            "total_ms": (ended - started) * 1e3,
+            "at": time.time(),
+        })
+
+    def call_metrics(self) -> List[dict]:
+        """The most recent calls, oldest first: kind, model, ok, ttft_ms, total_ms, at."""
+        return list(self._metrics)
+
+    def latency_summary(self) -> Dict[str, dict]:
+        """Per call kind: count and median / p95 of time to first token and total time (ms)."""
+        by_kind: Dict[str, List[dict]] = {}
+        for record in self.call_metrics():
+            if record["ok"]:
+                by_kind.setdefault(record["kind"], []).append(record)
+        summary = {}
+        for kind, records in by_kind.items():
+            ttft = sorted(r["ttft_ms"] for r in records)
+            total = sorted(r["total_ms"] for r in records)
+            p95 = min(len(records) - 1, int(len(records) * 0.95))
+            summary[kind] = {"count": len(records),
+                             "ttft_p50_ms": ttft[len(ttft) // 2], "ttft_p95_ms": ttft[p95],
+                             "total_p50_ms": total[len(total) // 2], "total_p95_ms": total[p95]}
+        return summary
+
+    def singleflight_stats(self) -> dict:
+        """leaders: requests sent; deduplicated: callers served by another caller's request."""
+        return self._singleflight.stats()
+
+    # --- Calls ---
+    def generate(self, prompt: str, model_name: Optional[str] = None) -> str:
+        model_name = model_name or self.model_name
+        return self._singleflight.do((model_name, prompt), lambda: self._generate(prompt, model_name))
+
+    def _generate(self, prompt: str, model_name: str) -> str:
+        backend = self._admit()
+        started, ok = time.perf_counter(), False
+        try:
+            text = self._with_timeout(backend.generate, prompt, model_name)
+            ok = True
+            return text
+        except Exception as e:
+            raise ModelError(str(e)) from e
+        finally:
+            self._breaker.record(ok)
+            self._record("generate", model_name, started, None, ok)
+
+    async def agenerate(self, prompt: str, model_name: Optional[str] = None) -> str:
+        model_name = model_name or self.model_name
+        key = (model_name, prompt)
+        flight, leader = self._singleflight.begin(key)
+        if not leader:
+            # The leader may be on another thread or event loop; wait without blocking this loop.
+            return await flight.wait_async()
+        try:
+            text = await self._agenerate(prompt, model_name)
+        except BaseException as e:
+            self._singleflight.finish(key, flight, error=e)
+            raise
+        self._singleflight.finish(key, flight, result=text)
+        return text
+
+    async def _agenerate(self, prompt: str, model_name: str) -> str:
+        backend = self._admit()
+        started, ok = time.perf_counter(), False
+        try:
+            if hasattr(backend, "agenerate"):
+                call = backend.agenerate(prompt, model_name)
+            else:
+                call = asyncio.get_running_loop().run_in_executor(self._call_pool(), backend.generate, prompt, model_name)
+            text = await asyncio.wait_for(call, MODEL_CALL_TIMEOUT)
+            ok = True
+            return text
+        except asyncio.TimeoutError as e:
+            raise ModelError(f"no reply within {MODEL_CALL_TIMEOUT:g}s") from e
+        except Exception as e:
+            raise ModelError(str(e)) from e
+        finally:
+            self._breaker.record(ok)
+            self._record("agenerate", model_name, started, None, ok)
+
+    def stream(self, prompt: str, model_name: Optional[str] = None) -> Iterator[str]:
+        """Yield the reply in chunks as the model produces them (one chunk if the backend cannot stream)."""
+        backend = self._admit()
+        model_name = model_name or self.model_name
+        started, first_chunk_at, ok, failed = time.perf_counter(), None, False, False
+        try:
+            if hasattr(backend, "stream"):
+                chunks = self._chunks_with_timeout(backend.stream(prompt, model_name))
+            else:
+                chunks = iter([self._with_timeout(backend.generate, prompt, model_name)])
+            for chunk in chunks:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                yield chunk
+            ok = True
+        except Exception as e:
+            failed = True
+            raise ModelError(str(e)) from e
+        finally:
+            # A consumer that stops reading early says nothing about the backend's health.
+            if ok or failed:
+                self._breaker.record(ok)
+            elif self._breaker.state == "half_open":
+                self._breaker.record(first_chunk_at is not None)
+            self._record("stream", model_name, started, first_chunk_at, ok)
+
+    def generate_batch(self, instruction: str, items: Dict[str, str], model_name: Optional[str] = None) -> Dict[str, str]:
+        """One round trip for all `items`; unusable results fall back to the input text."""
+        self._get_backend()
+        return batch_generate(lambda prompt: self.generate(prompt, model_name), instruction, items)
+
+
+_client: Optional[ModelClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ModelClient:
+    """The process-wide client for MODEL_BACKEND / MODEL_NAME."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ModelClient()
+        return _client
@@ -1,14 +1,708 @@
 # core/profile_manager.py
 
+import atexit
+import copy
 import json
 import os
 import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+from .fileio import atomic_write_json, file_signature
+from .reminder_store import ReminderStore
+
 ASSETS_DIR = "assets"
 PROFILES_DIR = os.path.join(ASSETS_DIR, "user_profiles")
 os.makedirs(PROFILES_DIR, exist_ok=True)
 
+# --- Storage backend ---
+# "json" keeps one file per user under PROFILES_DIR; "sqlite" stores
+# everything in PROFILE_DB_PATH (see core/sqlite_store.py). The public
+# functions below keep the same signatures whichever backend is active.
+PROFILE_BACKEND = os.environ.get("PROFILE_BACKEND", "json")
+PROFILE_DB_PATH = os.environ.get("PROFILE_DB_PATH", os.path.join(ASSETS_DIR, "profiles.sqlite3"))
+
+_store = None
+
+# --- In-process profile cache ---
+# Parsed profiles are shared by every Streamlit session in this process.
+# Entries are revalidated with a single os.stat() (mtime/size/inode), so a
+# rerun only re-parses a profile when its file actually changed on disk.
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "256"))
+
+_cache = OrderedDict()  # path -> (file signature, parsed profile, fingerprint)
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_write_stats = {"writes": 0, "skipped": 0}
+
+
+def _profile_path(username):
+    return os.path.join(PROFILES_DIR, f"{username}.json")
+
+
+def profile_fingerprint(profile: dict) -> str:
+    """Stable content hash of a profile (independent of key order)."""
+    canonical = json.dumps(profile, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def _cache_put(path, signature, data):
+    fingerprint = profile_fingerprint(data)
+    with _cache_lock:
+        _cache[path] = (signature, copy.deepcopy(data), fingerprint)
+        _cache.move_to_end(path)
+        _evict_overflow(_cache)
+
+
+def _load_json_file(path):
+    """Return a private copy of the parsed JSON at `path`, or None if missing."""
+    signature = file_signature(path)
+    if signature is None:
+        with _cache_lock:
+            _cache.pop(path, None)
+        return None
+
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == signature:
+            _cache.move_to_end(path)
+            _cache_stats["hits"] += 1
+            return copy.deepcopy(entry[1])
+        _cache_stats["misses"] += 1
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    _cache_put(path, signature, data)
+    return data
+
+
+def _cached_fingerprint(path, data):
+    """Fingerprint of what is on disk at `path`; `data` is its freshly loaded content."""
+    signature = file_signature(path)
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[2]
+    return profile_fingerprint(data)
+
+
+def _write_json_file(path, data):
+    atomic_write_json(path, data, indent=4)
+    with _cache_lock:
+        _write_stats["writes"] += 1
+    # Write-through so the next read in this process is a cache hit.
+    _cache_put(path, file_signature(path), data)
+
+
+def _evict_overflow(cache):
+    while len(cache) > max(PROFILE_CACHE_SIZE, 0):
+        cache.popitem(last=False)
+        _cache_stats["evictions"] += 1
+
+
+def set_profile_cache_size(size: int):
+    """Change the cache capacity, evicting least recently used entries if needed."""
+    global PROFILE_CACHE_SIZE
+    PROFILE_CACHE_SIZE = int(size)
+    with _cache_lock:
+        _evict_overflow(_cache)
+        _evict_overflow(_events_cache)
+
+
+def clear_profile_cache():
+    with _cache_lock:
+        _cache.clear()
+        _events_cache.clear()
+
+
+def get_profile_cache_stats() -> dict:
+    """Return hit/miss/eviction counters plus current size and capacity."""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats["size"] = len(_cache)
+    stats["capacity"] = PROFILE_CACHE_SIZE
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def get_profile_write_stats() -> dict:
+    """Return how many profile writes were performed and how many were skipped as unchanged."""
+    with _cache_lock:
+        return dict(_write_stats)
+
+
+def _count_skipped_write():
+    with _cache_lock:
+        _write_stats["skipped"] += 1
+
+# --- Usage event log ---
+# App opens are appended to <user>.events.jsonl instead of rewriting the
+# profile. usage_counts / streak / last_opened_app are derived by replaying
+# the log on top of the profile snapshot, and a background compaction folds
+# the log back into the snapshot once it grows past USAGE_COMPACT_THRESHOLD.
+# Each event carries a sequence number and the snapshot remembers the last
+# one it folded ("usage_log_seq"), so a crash mid-compaction never counts an
+# event twice.
+USAGE_COMPACT_THRESHOLD = int(os.environ.get("USAGE_COMPACT_THRESHOLD", "200"))
+USAGE_FIELDS = ("usage_counts", "last_opened_app", "streak", "usage_log_seq")
+
+_events_cache = OrderedDict()  # path -> (inode, bytes consumed, [(seq, app), ...])
+_user_locks = {}
+_user_locks_guard = threading.Lock()
+_compactions_pending = set()
+
+
+def _events_path(username):
+    return os.path.join(PROFILES_DIR, f"{username}.events.jsonl")
+
+
+def _user_lock(username):
+    with _user_locks_guard:
+        lock = _user_locks.get(username)
+        if lock is None:
+            lock = _user_locks[username] = threading.RLock()
+        return lock
+
+
+def _load_events(path):
+    """Return [(seq, app), ...] from an event log, parsing only newly appended bytes."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        with _cache_lock:
+            _events_cache.pop(path, None)
+        return []
+
+    with _cache_lock:
+        entry = _events_cache.get(path)
+    if entry is not None and entry[0] == st.st_ino and entry[1] <= st.st_size:
+        offset, events = entry[1], list(entry[2])
+        if offset == st.st_size:
+            return events
+    else:
+        offset, events = 0, []
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read()
+    # Only consume complete lines. A trailing write still in progress is picked
+    # up next time; one torn by a crash is closed off by the next append and
+    # then skipped as unparseable.
+    end = chunk.rfind(b"\n") + 1
+    for line in chunk[:end].splitlines():
+        try:
+            event = json.loads(line)
+            events.append((int(event["seq"]), event["app"]))
+        except (ValueError, KeyError, TypeError):
+            continue
+
+    with _cache_lock:
+        _events_cache[path] = (st.st_ino, offset + end, list(events))
+        _events_cache.move_to_end(path)
+        _evict_overflow(_events_cache)
+    return events
+
+
+def _apply_app_open(profile, app_name):
+    usage = profile.setdefault("usage_counts", {})
+    usage[app_name] = usage.get(app_name, 0) + 1
+
+    streak = profile.setdefault("streak", {"app": None, "len": 0})
+    if profile.get("last_opened_app") == app_name:
+        streak["app"] = app_name
+        streak["len"] = int(streak.get("len", 0)) + 1
+    else:
+        streak["app"] = app_name
+        streak["len"] = 1
+
+    profile["last_opened_app"] = app_name
+
+
+def _pending_events(username, snapshot):
+    folded = int(snapshot.get("usage_log_seq", 0))
+    return [(seq, app) for seq, app in _load_events(_events_path(username)) if seq > folded]
+
+
+def _with_usage_events(username, snapshot):
+    """Replay not-yet-compacted app opens on top of a profile snapshot."""
+    for seq, app_name in _pending_events(username, snapshot):
+        _apply_app_open(snapshot, app_name)
+        snapshot["usage_log_seq"] = seq
+    return snapshot
+
+
+def compact_usage_log(username) -> bool:
+    """Fold the user's event log into the profile snapshot. Returns True if anything was folded."""
+    with _user_lock(username):
+        _compactions_pending.discard(username)
+        snapshot = _load_json_file(_profile_path(username))
+        if snapshot is None:
+            return False
+        if not _pending_events(username, snapshot):
+            return False
+        snapshot = _with_usage_events(username, snapshot)
+        _write_json_file(_profile_path(username), snapshot)
+        # Safe to drop: everything in the log is now <= usage_log_seq.
+        events_path = _events_path(username)
+        try:
+            os.remove(events_path)
+        except FileNotFoundError:
+            pass
+        with _cache_lock:
+            _events_cache.pop(events_path, None)
+        return True
+
+
+def _schedule_compaction(username):
+    with _user_locks_guard:
+        if username in _compactions_pending:
+            return
+        _compactions_pending.add(username)
+    threading.Thread(target=compact_usage_log, args=(username,), daemon=True).start()
+
+
+# --- Profile summary index ---
+# A small username -> {age, usage_counts, usage_total} map kept in memory and
+# persisted to PROFILE_INDEX_PATH, so household-wide views (the Wellbeing
+# panel) never open every profile. It is updated on every profile write and
+# app open; disk flushes are debounced by INDEX_FLUSH_DELAY seconds, and a
+# pending flush also runs at interpreter exit. Each entry records the
+# signatures of the profile file and event log it was summarized from; on
+# load, entries whose files changed since (e.g. a write whose flush was lost
+# in a crash) are re-summarized, and users added or removed are reconciled.
+PROFILE_INDEX_PATH = os.path.join(ASSETS_DIR, "profile_index.json")
+INDEX_FLUSH_DELAY = 1.0
+
+_index = None
+_index_lock = threading.Lock()
+_index_flush_timer = None
+_UNSET = object()
+
+
+def _profile_summary(profile):
+    usage = dict(profile.get("usage_counts") or {})
+    return {
+        "username": profile.get("username"),
+        "age": profile.get("age"),
+        "usage_counts": usage,
+        "usage_total": sum(usage.values()),
+    }
+
+
+def _index_signature(username):
+    """Signatures of the files a summary is derived from (JSON-friendly)."""
+    return [list(sig) if sig else None
+            for sig in (file_signature(_profile_path(username)), file_signature(_events_path(username)))]
+
+
+def _summarize_user(username):
+    signature = _index_signature(username)
+    profile = _json_get_user_profile(username)
+    if profile is None:
+        return None
+    profile.setdefault("username", username)
+    entry = _profile_summary(profile)
+    entry["signature"] = signature
+    return entry
+
+
+def _profile_usernames():
+    return {f[:-len(".json")] for f in os.listdir(PROFILES_DIR) if f.endswith(".json")}
+
+
+def _load_index():
+    """Return the in-memory index, loading or rebuilding it on first use."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+    index = None
+    if os.path.exists(PROFILE_INDEX_PATH):
+        try:
+            with open(PROFILE_INDEX_PATH, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+    if not isinstance(index, dict):
+        index = _build_index()
+        stale = True
+    else:
+        index, stale = _reconcile_index(index)
+    with _index_lock:
+        if _index is None:
+            _index = index
+        index = _index
+    if stale:
+        _schedule_index_flush()
+    return index
+
+
+def _reconcile_index(index):
+    """Re-summarize entries whose files changed since they were indexed; returns (index, changed)."""
+    usernames = _profile_usernames()
+    changed = False
+    for username in set(index) - usernames:
+        del index[username]
+        changed = True
+    for username in usernames:
+        entry = index.get(username)
+        if entry is not None and entry.get("signature") == _index_signature(username):
+            continue
+        summary = _summarize_user(username)
+        if summary is None:
+            index.pop(username, None)
+        else:
+            index[username] = summary
+        changed = True
+    return index, changed
+
+
+def _build_index():
+    index = {}
+    for username in _profile_usernames():
+        summary = _summarize_user(username)
+        if summary is not None:
+            index[username] = summary
+    return index
+
+
+def rebuild_profile_index():
+    """Rescan every profile and replace the summary index."""
+    global _index
+    index = _build_index()
+    with _index_lock:
+        _index = index
+    _schedule_index_flush()
+
+
+def _index_update(username, profile=None, age=_UNSET, app_opened=None):
+    # Called with the user's lock held, so it must never trigger a rebuild
+    # (which takes other users' locks). Writers warm the index beforehand.
+    if _store is not None:
+        return
+    with _index_lock:
+        index = _index
+        if index is None:
+            return
+        if profile is not None:
+            index[username] = _profile_summary(profile)
+        else:
+            entry = index.setdefault(username, _profile_summary({"username": username}))
+            if age is not _UNSET:
+                entry["age"] = age
+            if app_opened is not None:
+                entry["usage_counts"][app_opened] = entry["usage_counts"].get(app_opened, 0) + 1
+                entry["usage_total"] += 1
+        # Callers hold the user's lock and have just written, so this matches the entry.
+        index[username]["signature"] = _index_signature(username)
+    _schedule_index_flush()
+
+
+def _flush_index():
+    global _index_flush_timer
+    with _index_lock:
+        _index_flush_timer = None
+        if _index is None:
+            return
+        data = copy.deepcopy(_index)
+    atomic_write_json(PROFILE_INDEX_PATH, data, indent=4)
+
+
+def _schedule_index_flush():
+    global _index_flush_timer
+    with _index_lock:
+        if _index_flush_timer is not None:
+            return
+        _index_flush_timer = threading.Timer(INDEX_FLUSH_DELAY, _flush_index)
+        _index_flush_timer.daemon = True
+        _index_flush_timer.start()
+
+
+@atexit.register
+def _flush_index_at_exit():
+    with _index_lock:
+        timer = _index_flush_timer
+    if timer is not None:
+        timer.cancel()
+        _flush_index()
+
+
+def get_profile_summaries(max_age: int | None = None) -> list:
+    """Username, age and usage totals for every profile (optionally age < max_age)."""
+    if _store is not None:
+        return _store.usage_summaries(max_age)
+    index = _load_index()
+    with _index_lock:
+        summaries = [
+            {k: copy.deepcopy(v) for k, v in entry.items() if k != "signature"} for entry in index.values()
+            if max_age is None or (entry.get("age") if entry.get("age") is not None else 18) < max_age
+        ]
+    return sorted(summaries, key=lambda e: e["username"] or "")
+
+
+def get_household_usage(max_age: int = 18) -> list:
+    """Every child profile on this device with its usage, in one pass over the index."""
+    return get_profile_summaries(max_age)
+
+
+def use_storage_backend(name: str, db_path: str | None = None):
+    """Switch the process to the "json" or "sqlite" backend."""
+    global _store, PROFILE_BACKEND
+    if name == "json":
+        _store = None
+    elif name == "sqlite":
+        from .sqlite_store import SQLiteProfileStore
+        _store = SQLiteProfileStore(db_path or PROFILE_DB_PATH)
+    else:
+        raise ValueError(f"Unknown profile backend: {name}")
+    PROFILE_BACKEND = name
+
+
+# --- Versioning / optimistic concurrency ---
+# Every stored profile carries a "version" that is bumped on each write.
+# Writers never blindly overwrite: a caller whose copy is older than the
+# stored one gets its changes three-way merged onto the stored snapshot,
+# using the version it originally read as the base. If that base has
+# already been evicted from the history the write is refused as a conflict
+# rather than guessed at, and the caller has to re-read. Usage counters cannot
+# conflict at all because each increment is its own appended event. Locks
+# are per user, so sessions of different users never wait on each other.
+PROFILE_HISTORY_SIZE = 512
+CAS_RETRIES = 8
+
+_history = OrderedDict()  # (username, version) -> snapshot as stored at that version
+_conflict_stats = {"conflicts": 0, "merges": 0, "retries": 0, "gave_up": 0}
+_MISSING = object()
+# Fields whose value is a {key: count} dict; concurrent edits to them are
+# added together. Every other field resolves conflicts last-writer-wins.
+# (usage_counts is normally owned by the event log and taken from the store
+# as-is; the merge only sees it for fields not in STORE_OWNED_FIELDS.)
+COUNTER_FIELDS = frozenset({"usage_counts"})
+
+
+def _remember_version(username, snapshot):
+    key = (username, int(snapshot.get("version", 0)))
+    with _cache_lock:
+        if key not in _history:
+            _history[key] = copy.deepcopy(snapshot)
+        _history.move_to_end(key)
+        while len(_history) > PROFILE_HISTORY_SIZE:
+            _history.popitem(last=False)
+
+
+def _base_version(username, version):
+    with _cache_lock:
+        return copy.deepcopy(_history.get((username, int(version))))
+
+
+def _merge_values(base, current, ours, counter=False):
+    """
+    Three-way merge of one field; _MISSING on any side means the field is
+    absent there. `counter` marks a COUNTER_FIELDS value.
+    """
+    if ours == base:
+        return current
+    if current == base:
+        return ours
+    if current is _MISSING or ours is _MISSING:
+        return ours if current is _MISSING else current
+    if counter and isinstance(current, dict) and isinstance(ours, dict):
+        # Counters merge by adding each side's delta, so the result does not
+        # depend on which writer lands first and no increment is dropped.
+        base_counts = base if isinstance(base, dict) else {}
+        return {
+            k: current.get(k, 0) + ours.get(k, 0) - base_counts.get(k, 0)
+            for k in set(current) | set(ours)
+        }
+    if isinstance(current, list) and isinstance(ours, list):
+        base_items = base if isinstance(base, list) else []
+        removed = [x for x in base_items if x not in ours]
+        added = [x for x in ours if x not in base_items and x not in current]
+        return [x for x in current if x not in removed] + added
+    if isinstance(current, dict) and isinstance(ours, dict):
+        base_dict = base if isinstance(base, dict) else {}
+        merged = {}
+        for k in set(current) | set(ours):
+            value = _merge_values(base_dict.get(k, _MISSING), current.get(k, _MISSING), ours.get(k, _MISSING))
+            if value is not _MISSING:
+                merged[k] = value
+        return merged
+    return ours
+
+
+def _merge_profiles(base, current, ours):
+    merged = {}
+    for key in set(current) | set(ours):
+        if key in STORE_OWNED_FIELDS or key == "version":
+            value = current.get(key, _MISSING)
+        else:
+            value = _merge_values(base.get(key, _MISSING), current.get(key, _MISSING), ours.get(key, _MISSING),
+                                  counter=key in COUNTER_FIELDS)
+        if value is not _MISSING:
+            merged[key] = value
+    return merged
+
+
+def _load_snapshot(username):
+    if _store is not None:
+        return _store.load(username)
+    return _load_json_file(_profile_path(username))
+
+
+def _store_snapshot(username, snapshot, expected_version):
+    """
+    Persist a snapshot. The SQLite store checks `expected_version` and
+    returns False if another process bumped it first; the JSON files have
+    no cross-process compare-and-swap (only the per-user lock in this
+    process), so that path always returns True.
+    """
+    if _store is not None:
+        if not _store.save(username, snapshot, expected_version):
+            return False
+        with _cache_lock:
+            _write_stats["writes"] += 1
+        return True
+    _write_json_file(_profile_path(username), snapshot)
+    _index_update(username, age=snapshot.get("age"))
+    return True
+
+
+def _write_profile(username, profile_data, expected_version=None) -> bool:
+    """
+    Merge `profile_data` onto the stored profile and write it with a bumped
+    version. With `expected_version`, act as compare-and-swap and return
+    False instead of merging when the stored version differs. A stale copy
+    whose base version is no longer in the history cannot be merged safely,
+    so it is also refused with False and nothing is written.
+    """
+    if _store is None:
+        _load_index()
+    for _ in range(CAS_RETRIES):
+        with _user_lock(username):
+            current = _load_snapshot(username)
+            if current is None:
+                snapshot = dict(profile_data)
+                snapshot.pop("usage_log_seq", None)
+                snapshot["version"] = 1
+                if not _store_snapshot(username, snapshot, None):
+                    continue
+                profile_data["version"] = 1
+                _remember_version(username, snapshot)
+                return True
+
+            cur_version = int(current.get("version", 0))
+            ours_version = profile_data.get("version")
+            if expected_version is not None and int(expected_version) != cur_version:
+                with _cache_lock:
+                    _conflict_stats["conflicts"] += 1
+                return False
+
+            _remember_version(username, current)
+            if ours_version is not None and int(ours_version) != cur_version:
+                base = _base_version(username, ours_version)
+                if base is None:
+                    with _cache_lock:
+                        _conflict_stats["conflicts"] += 1
+                    return False
+                with _cache_lock:
+                    _conflict_stats["merges"] += 1
+            else:
+                base = current
+            snapshot = _merge_profiles(base, current, profile_data)
+
+            snapshot["version"] = cur_version
+            if _store is None:
+                unchanged = profile_fingerprint(snapshot) == _cached_fingerprint(_profile_path(username), current)
+            else:
+                unchanged = profile_fingerprint(snapshot) == profile_fingerprint(current)
+            if unchanged:
+                _count_skipped_write()
+            else:
+                snapshot["version"] = cur_version + 1
+                if not _store_snapshot(username, snapshot, cur_version):
+                    continue
+                _remember_version(username, snapshot)
+
+            # Bring the caller's copy up to the stored version so its next
+            # write is a plain fast-path update rather than another merge.
+            for key in (set(profile_data) | set(snapshot)) - set(STORE_OWNED_FIELDS):
+                if key in snapshot:
+                    profile_data[key] = copy.deepcopy(snapshot[key])
+                else:
+                    profile_data.pop(key, None)
+            return True
+    with _cache_lock:
+        _conflict_stats["gave_up"] += 1
+    return False
+
+
+def compare_and_swap_profile(username, expected_version, profile_data) -> bool:
+    """Write `profile_data` only if the stored version is still `expected_version`."""
+    if profile_data.get("guest_mode"):
+        return False
+    return _write_profile(username, profile_data, expected_version)
+
+
+def update_profile_with(username, mutate, retries: int = CAS_RETRIES):
+    """
+    Read-modify-write loop: call `mutate(profile)` on a fresh copy and commit
+    it with compare-and-swap, retrying on conflict. Returns the committed
+    profile, or None if the user does not exist or every attempt conflicted.
+    """
+    for attempt in range(retries):
+        profile = get_user_profile(username)
+        if profile is None:
+            return None
+        mutate(profile)
+        if _write_profile(username, profile, int(profile.get("version", 0))):
+            return profile
+        with _cache_lock:
+            _conflict_stats["retries"] += 1
+        time.sleep(random.uniform(0, 0.001 * (attempt + 1)))
+    with _cache_lock:
+        _conflict_stats["gave_up"] += 1
+    return None
+
+
+def get_profile_conflict_stats() -> dict:
+    with _cache_lock:
+        return dict(_conflict_stats)
+
+
+# --- Reminders ---
+# Reminders live in a per-user ReminderStore (core/reminder_store.py), kept
+# sorted by due time. Profiles still expose them as "reminders", but that
+# field is derived on read and never written back from a caller's copy.
+# Reminder lists left inside older JSON profiles are imported on first use.
+STORE_OWNED_FIELDS = USAGE_FIELDS + ("reminders",)
+
+_reminder_stores = {}
+
+
+def _reminders_path(username):
+    return os.path.join(PROFILES_DIR, f"{username}.reminders.jsonl")
+
+
+def _json_reminder_store(username):
+    with _user_lock(username):
+        with _user_locks_guard:
+            store = _reminder_stores.get(username)
+            if store is None:
+                store = _reminder_stores[username] = ReminderStore(_reminders_path(username))
+        if not os.path.exists(store.path):
+            snapshot = _load_json_file(_profile_path(username))
+            if snapshot and snapshot.get("reminders"):
+                for r in snapshot["reminders"]:
+                    store.add(r.get("text", "Reminder"), r.get("due") or r.get("when_iso"), r.get("created_at"))
+                snapshot["reminders"] = []
+                _write_json_file(_profile_path(username), snapshot)
+        return store
+
+
 def _hash_pin(pin):
     return hashlib.sha256(pin.encode()).hexdigest()
 
@@ -22,29 +716,43 @@ def ensure_profile_defaults(profile: dict) -> dict:
     return profile
 
 def create_user_profile(username, age, pin):
-    profile_path = os.path.join(PROFILES_DIR, f"{username}.json")
-    if os.path.exists(profile_path):
-        return False, "Username already exists."
-    
     # Use the consistent key "usage_counts" from the start
     user_data = {
         "username": username,
         "age": age,
-        "pin_hash": _hash_pin(pin)
+        "pin_hash": _hash_pin(pin),
+        "version": 1,
     }
     user_data = ensure_profile_defaults(user_data) # Add all default fields
-    
-    with open(profile_path, 'w') as f:
-        json.dump(user_data, f, indent=4)
+
+    if _store is not None:
+        if not _store.create(user_data):
+            return False, "Username already exists."
+        return True, "User created successfully."
+
+    profile_path = _profile_path(username)
+    if os.path.exists(profile_path):
+        return False, "Username already exists."
+    _load_index()
+    _write_json_file(profile_path, user_data)
+    _index_update(username, profile=user_data)
     return True, "User created successfully."
 
+def _json_get_user_profile(username):
+    with _user_lock(username):
+        profile = _load_json_file(_profile_path(username))
+        if profile is None:
+            return None
+        # Ensure any loaded profile is also checked for default fields
+        profile = _with_usage_events(username, ensure_profile_defaults(profile))
+        profile["reminders"] = _json_reminder_store(username).active()
+        return profile
+
 def get_user_profile(username):
-    profile_path = os.path.join(PROFILES_DIR, f"{username}.json")
-    if os.path.exists(profile_path):
-        with open(profile_path, 'r') as f:
-            # Ensure any loaded profile is also checked for default fields
-            return ensure_profile_defaults(json.load(f))
-    return None
+    if _store is not None:
+        profile = _store.load(username)
+        return ensure_profile_defaults(profile) if profile is not None else None
+    return _json_get_user_profile(username)
 
 def verify_user_pin(username, pin):
     profile = get_user_profile(username)
@@ -53,52 +761,113 @@ def verify_user_pin(username, pin):
     return False
 
 def update_user_profile(username, profile_data):
+    """
+    Persist a profile snapshot. Usage fields are owned by the event log, so
+    the values already on disk are kept rather than the caller's copy. If
+    the stored version moved on since `profile_data` was read, the caller's
+    changes are merged in instead of overwriting the other writer's, and
+    `profile_data` is refreshed in place to the stored version.
+    Nothing is written when the snapshot's fingerprint matches the stored one.
+    Returns False when the copy is too stale to merge (its base version has
+    been evicted); the caller should re-read the profile and reapply.
+    """
     if profile_data.get("guest_mode"):
-        return
-    profile_path = os.path.join(PROFILES_DIR, f"{username}.json")
-    with open(profile_path, 'w') as f:
-        json.dump(profile_data, f, indent=4)
+        return False
+    return _write_profile(username, profile_data)
 
 def get_all_profiles():
+    if _store is not None:
+        return _store.list_all()
     profiles = []
     for filename in os.listdir(PROFILES_DIR):
         if filename.endswith(".json"):
-            with open(os.path.join(PROFILES_DIR, filename), 'r') as f:
-                profiles.append(json.load(f))
+            username = filename[:-len(".json")]
+            with _user_lock(username):
+                profile = _load_json_file(os.path.join(PROFILES_DIR, filename))
+                if profile is not None:
+                    profiles.append(_with_usage_events(username, profile))
     return profiles
 
+def get_profiles_below_age(max_age: int):
+    """All profiles with age < max_age (index lookup on the SQLite backend)."""
+    if _store is not None:
+        return _store.profiles_below_age(max_age)
+    return [p for p in get_all_profiles() if p.get("age", 18) < max_age]
+
 def record_app_open(username: str, app_name: str) -> dict:
-    profile = get_user_profile(username)
-    if not profile:
-        return {}
-    
-    usage = profile.get("usage_counts", {})
-    usage[app_name] = usage.get(app_name, 0) + 1
-    profile["usage_counts"] = usage
+    """Append an app-open event (O(1) write) and return the derived profile."""
+    if _store is not None:
+        profile = _store.record_app_open(username, app_name)
+        return ensure_profile_defaults(profile) if profile else {}
 
-    prev = profile.get("last_opened_app")
-    if prev == app_name:
-        profile["streak"]["app"] = app_name
-        profile["streak"]["len"] = int(profile["streak"].get("len", 0)) + 1
-    else:
-        profile["streak"]["app"] = app_name
-        profile["streak"]["len"] = 1
+    _load_index()
+    with _user_lock(username):
+        snapshot = _load_json_file(_profile_path(username))
+        if not snapshot:
+            return {}
+        events = _load_events(_events_path(username))
+        last_seq = max([int(snapshot.get("usage_log_seq", 0))] + [seq for seq, _ in events[-1:]])
+        event = {"seq": last_seq + 1, "app": app_name, "ts": datetime.now().isoformat()}
+        with open(_events_path(username), 'ab+') as f:
+            # Terminate a line torn by a crash mid-append so this event does
+            # not get glued onto it.
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write((json.dumps(event) + "\n").encode())
+        profile = _json_get_user_profile(username)
+        _index_update(username, app_opened=app_name)
 
-    profile["last_opened_app"] = app_name
-
-    update_user_profile(username, profile)
+    if int(profile.get("usage_log_seq", 0)) - int(snapshot.get("usage_log_seq", 0)) >= USAGE_COMPACT_THRESHOLD:
+        _schedule_compaction(username)
     return profile
 
 def add_reminder(username: str, text: str, due_iso: str | None):
-    profile = get_user_profile(username) or {"username": username}
-    profile = ensure_profile_defaults(profile)
-    reminders = profile.get("reminders", [])
-    reminders.append({"text": text, "due": due_iso, "created_at": datetime.now().isoformat()})
-    profile["reminders"] = reminders
-    update_user_profile(username, profile)
-    return profile
+    """Add one reminder without rewriting the profile; returns the updated profile."""
+    if get_user_profile(username) is None:
+        update_user_profile(username, {"username": username})
+    append_reminder(username, text, due_iso)
+    return get_user_profile(username)
+
+def append_reminder(username: str, text: str, due_iso: str | None) -> dict:
+    """Add one reminder to an existing user's store and return it; the profile is not read."""
+    created_at = datetime.now().isoformat()
+    if _store is not None:
+        return _store.add_reminder(username, text, due_iso, created_at)
+    return _json_reminder_store(username).add(text, due_iso, created_at)
 
 def list_reminders(username: str):
-    profile = get_user_profile(username) or {"username": username}
-    profile = ensure_profile_defaults(profile)
-    return profile.get("reminders", [])
\ No newline at end of file
+    """Reminders not yet done, sorted by due time (undated last)."""
+    if _store is not None:
+        return _store.list_reminders(username)
+    return _json_reminder_store(username).active()
+
+def upcoming_reminders(username: str, n: int = 5, now: datetime | None = None):
+    if _store is not None:
+        return _store.upcoming_reminders(username, n, now or datetime.now())
+    return _json_reminder_store(username).upcoming(n, now)
+
+def reminders_between(username: str, start: datetime, end: datetime):
+    """Reminders due in [start, end)."""
+    if _store is not None:
+        return _store.reminders_between(username, start, end)
+    return _json_reminder_store(username).between(start, end)
+
+def overdue_reminders(username: str, now: datetime | None = None):
+    if _store is not None:
+        return _store.reminders_between(username, datetime.min, now or datetime.now())
+    return _json_reminder_store(username).overdue(now)
+
+def complete_reminder(username: str, reminder_id) -> bool:
+    if _store is not None:
+        return _store.complete_reminder(username, reminder_id)
+    return _json_reminder_store(username).complete(reminder_id)
+
+def delete_reminder(username: str, reminder_id) -> bool:
+    if _store is not None:
+        return _store.delete_reminder(username, reminder_id)
+    return _json_reminder_store(username).delete(reminder_id)
+
+if PROFILE_BACKEND != "json":
+    use_storage_backend(PROFILE_BACKEND)
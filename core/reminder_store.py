@@ -0,0 +1,183 @@
+# core/reminder_store.py
+"""
+Per-user reminder store kept sorted by due time.
+
+Reminders used to live as an unsorted list inside the profile, so every
+reader had to sort and parse them. Here each user has an append-only op log
+(<user>.reminders.jsonl: add / done / delete) replayed into an in-memory
+list ordered by due time, so "next N", "due between" and "overdue" are
+bisect lookups and completing or deleting a reminder appends one line
+instead of rewriting the profile.
+
+Every reminder uses the field name "due" (naive ISO timestamp or None).
+Reminders without a due time sort after all dated ones.
+"""
+import json
+import threading
+import uuid
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .fileio import atomic_write, file_signature
+
+# Rewrite the op log once it holds this many more lines than live reminders.
+COMPACT_SLACK = 64
+
+_UNDATED = datetime.max
+
+
+def due_key(due_iso: Optional[str]) -> datetime:
+    """Sort key for a reminder's "due" value; undated or unparsable ones sort last."""
+    if not due_iso:
+        return _UNDATED
+    try:
+        dt = datetime.fromisoformat(due_iso)
+    except (TypeError, ValueError):
+        return _UNDATED
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def upcoming_in(reminders: List[dict], now: datetime, n: int) -> List[dict]:
+    """Next `n` dated reminders at or after `now` from a list already sorted by due."""
+    start = bisect_left(reminders, now, key=lambda r: due_key(r.get("due")))
+    return [r for r in reminders[start:start + n] if due_key(r.get("due")) != _UNDATED]
+
+
+class ReminderStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._by_id: Dict[str, dict] = {}
+        self._order: list = []  # sorted (due key, seq, id) for reminders not yet done
+        self._seq = 0
+        self._ops = 0
+        self._signature = None
+
+    # --- Persistence ---
+    def _refresh(self):
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+        self._by_id, self._order, self._seq, self._ops = {}, [], 0, 0
+        if signature is not None:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        self._signature = signature
+
+    def _apply(self, op: dict):
+        self._ops += 1
+        kind = op["op"]
+        if kind == "add":
+            reminder = {"id": op["id"], "text": op.get("text", ""), "due": op.get("due"),
+                        "created_at": op.get("created_at")}
+            self._by_id[reminder["id"]] = reminder
+            self._seq += 1
+            reminder["_seq"] = self._seq
+            if op.get("done_at"):
+                reminder["done_at"] = op["done_at"]
+            else:
+                insort(self._order, (due_key(reminder["due"]), self._seq, reminder["id"]))
+        elif kind in ("done", "delete"):
+            reminder = self._by_id.get(op["id"])
+            if reminder is None:
+                return
+            if not reminder.get("done_at"):
+                entry = (due_key(reminder["due"]), reminder["_seq"], reminder["id"])
+                i = bisect_left(self._order, entry)
+                if i < len(self._order) and self._order[i] == entry:
+                    self._order.pop(i)
+            if kind == "done":
+                reminder["done_at"] = op.get("at")
+            else:
+                del self._by_id[op["id"]]
+
+    def _append(self, op: dict):
+        self._apply(op)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(op) + "\n")
+        self._signature = file_signature(self.path)
+        if self._ops > len(self._by_id) + COMPACT_SLACK:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the op log so it holds one line per remaining reminder."""
+        with self._lock:
+            self._refresh()
+            reminders = sorted(self._by_id.values(), key=lambda r: r["_seq"])
+
+            def write(f):
+                for r in reminders:
+                    op = {"op": "add", "id": r["id"], "text": r["text"], "due": r["due"],
+                          "created_at": r["created_at"]}
+                    if r.get("done_at"):
+                        op["done_at"] = r["done_at"]
+                    f.write(json.dumps(op) + "\n")
+
+            atomic_write(self.path, write)
+            self._signature = None
+            self._refresh()
+
+    # --- Mutations ---
+    def add(self, text: str, due_iso: Optional[str], created_at: Optional[str] = None) -> dict:
+        with self._lock:
+            self._refresh()
+            op = {"op": "add", "id": uuid.uuid4().hex[:12], "text": text, "due": due_iso,
+                  "created_at": created_at or datetime.now().isoformat()}
+            self._append(op)
+            return self._public(self._by_id[op["id"]])
+
+    def complete(self, reminder_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            reminder = self._by_id.get(reminder_id)
+            if reminder is None or reminder.get("done_at"):
+                return False
+            self._append({"op": "done", "id": reminder_id, "at": datetime.now().isoformat()})
+            return True
+
+    def delete(self, reminder_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            if reminder_id not in self._by_id:
+                return False
+            self._append({"op": "delete", "id": reminder_id})
+            return True
+
+    # --- Queries ---
+    @staticmethod
+    def _public(reminder: dict) -> dict:
+        return {k: v for k, v in reminder.items() if k != "_seq"}
+
+    def _slice(self, lo: int, hi: int) -> List[dict]:
+        return [self._public(self._by_id[rid]) for _, _, rid in self._order[lo:hi]]
+
+    def active(self) -> List[dict]:
+        """Every reminder not yet done, sorted by due time."""
+        with self._lock:
+            self._refresh()
+            return self._slice(0, len(self._order))
+
+    def upcoming(self, n: int, now: Optional[datetime] = None) -> List[dict]:
+        with self._lock:
+            self._refresh()
+            start = bisect_left(self._order, ((now or datetime.now()),))
+            end = min(start + n, bisect_left(self._order, (_UNDATED,)))
+            return self._slice(start, end)
+
+    def between(self, start: datetime, end: datetime) -> List[dict]:
+        """Reminders due in [start, end)."""
+        with self._lock:
+            self._refresh()
+            return self._slice(bisect_left(self._order, (start,)), bisect_left(self._order, (end,)))
+
+    def overdue(self, now: Optional[datetime] = None) -> List[dict]:
+        with self._lock:
+            self._refresh()
+            return self._slice(0, bisect_left(self._order, ((now or datetime.now()),)))
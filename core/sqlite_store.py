@@ -0,0 +1,305 @@
+# core/sqlite_store.py
+"""
+SQLite storage backend for user profiles.
+
+Profiles are split into normalized tables (users, usage_counts, reminders)
+so questions like "every profile under 18" or "reminders due before X" are
+answered from an index instead of by loading every JSON file. The database
+runs in WAL mode so Streamlit sessions can read while another one writes.
+
+Enable it with PROFILE_BACKEND=sqlite (see core/profile_manager.py), and
+import existing JSON profiles with:
+
+    python -m core.sqlite_store migrate [db_path]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username        TEXT PRIMARY KEY,
+    age             INTEGER,
+    pin_hash        TEXT,
+    last_opened_app TEXT,
+    streak_app      TEXT,
+    streak_len      INTEGER NOT NULL DEFAULT 0,
+    extra           TEXT NOT NULL DEFAULT '{}',
+    version         INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_users_age ON users(age);
+
+CREATE TABLE IF NOT EXISTS usage_counts (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    app      TEXT NOT NULL,
+    count    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, app)
+);
+
+CREATE TABLE IF NOT EXISTS reminders (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    username   TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    text       TEXT NOT NULL,
+    due        TEXT,
+    created_at TEXT NOT NULL,
+    done_at    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders(due);
+CREATE INDEX IF NOT EXISTS idx_reminders_user_due ON reminders(username, due);
+"""
+
+# Profile keys stored in their own columns/tables; everything else goes to `extra`.
+_COLUMN_FIELDS = {"username", "age", "pin_hash", "last_opened_app", "streak",
+                  "usage_counts", "reminders", "usage_log_seq", "version"}
+
+
+class SQLiteProfileStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(users)")}
+            if "version" not in columns:
+                conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(reminders)")}
+            if "done_at" not in columns:
+                conn.execute("ALTER TABLE reminders ADD COLUMN done_at TEXT")
+
+    # --- Connections ---
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; Streamlit runs each session on its own thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # --- Row <-> profile ---
+    def _row_to_profile(self, conn, row) -> dict:
+        profile = json.loads(row["extra"] or "{}")
+        profile.update({
+            "username": row["username"],
+            "age": row["age"],
+            "last_opened_app": row["last_opened_app"],
+            "streak": {"app": row["streak_app"], "len": row["streak_len"]},
+            "version": row["version"],
+        })
+        if row["pin_hash"] is not None:
+            profile["pin_hash"] = row["pin_hash"]
+        profile["usage_counts"] = {
+            r["app"]: r["count"]
+            for r in conn.execute("SELECT app, count FROM usage_counts WHERE username = ?", (row["username"],))
+        }
+        profile["reminders"] = self._reminders(conn, row["username"])
+        return profile
+
+    @staticmethod
+    def _reminder_rows(rows) -> list:
+        return [{"id": str(r["id"]), "text": r["text"], "due": r["due"], "created_at": r["created_at"]}
+                for r in rows]
+
+    def _reminders(self, conn, username) -> list:
+        # Same ordering as ReminderStore: by due time, undated last.
+        rows = conn.execute(
+            "SELECT id, text, due, created_at FROM reminders WHERE username = ? AND done_at IS NULL"
+            " ORDER BY due IS NULL, due, id", (username,)
+        )
+        return self._reminder_rows(rows)
+
+    @staticmethod
+    def _extra(profile: dict) -> str:
+        # Canonical JSON keeps the stored text stable across rewrites.
+        return json.dumps({k: v for k, v in profile.items() if k not in _COLUMN_FIELDS},
+                          sort_keys=True, separators=(",", ":"), default=str)
+
+    # --- Profiles ---
+    def create(self, profile: dict) -> bool:
+        conn = self._connect()
+        streak = profile.get("streak") or {}
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO users (username, age, pin_hash, last_opened_app, streak_app, streak_len, extra, version)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (profile["username"], profile.get("age"), profile.get("pin_hash"),
+                     profile.get("last_opened_app"), streak.get("app"), int(streak.get("len", 0) or 0),
+                     self._extra(profile), int(profile.get("version", 1))),
+                )
+                conn.executemany(
+                    "INSERT INTO usage_counts (username, app, count) VALUES (?, ?, ?)",
+                    [(profile["username"], app, int(n)) for app, n in (profile.get("usage_counts") or {}).items()],
+                )
+                conn.executemany(
+                    "INSERT INTO reminders (username, text, due, created_at) VALUES (?, ?, ?, ?)",
+                    [(profile["username"], r.get("text", ""), r.get("due") or r.get("when_iso"), r.get("created_at") or datetime.now().isoformat())
+                     for r in (profile.get("reminders") or [])],
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def load(self, username: str):
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return self._row_to_profile(conn, row) if row else None
+
+    def save(self, username: str, profile: dict, expected_version=None) -> bool:
+        """
+        Write the profile row with the version in `profile`. Usage and reminders
+        are owned by their own calls. With `expected_version` this is a
+        compare-and-swap: returns False if the stored version has moved on.
+        """
+        conn = self._connect()
+        version = int(profile.get("version", 1))
+        with conn:
+            if expected_version is None:
+                cur = conn.execute(
+                    "INSERT INTO users (username, age, pin_hash, extra, version) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(username) DO UPDATE SET age = excluded.age,"
+                    " pin_hash = COALESCE(excluded.pin_hash, users.pin_hash), extra = excluded.extra,"
+                    " version = users.version + 1",
+                    (username, profile.get("age"), profile.get("pin_hash"), self._extra(profile), version),
+                )
+            else:
+                cur = conn.execute(
+                    "UPDATE users SET age = ?, pin_hash = COALESCE(?, pin_hash), extra = ?, version = ?"
+                    " WHERE username = ? AND version = ?",
+                    (profile.get("age"), profile.get("pin_hash"), self._extra(profile), version,
+                     username, int(expected_version)),
+                )
+        return cur.rowcount > 0
+
+    def list_all(self) -> list:
+        conn = self._connect()
+        return [self._row_to_profile(conn, row) for row in conn.execute("SELECT * FROM users ORDER BY username")]
+
+    def profiles_below_age(self, max_age: int) -> list:
+        conn = self._connect()
+        rows = conn.execute("SELECT * FROM users WHERE age < ? ORDER BY username", (max_age,))
+        return [self._row_to_profile(conn, row) for row in rows]
+
+    def usage_summaries(self, max_age=None) -> list:
+        """Username, age and usage counts for every (or every age < max_age) user in one query."""
+        conn = self._connect()
+        sql = ("SELECT u.username, u.age, c.app, c.count FROM users u"
+               " LEFT JOIN usage_counts c ON c.username = u.username")
+        params = ()
+        if max_age is not None:
+            sql += " WHERE u.age < ?"
+            params = (max_age,)
+        summaries = {}
+        for row in conn.execute(sql + " ORDER BY u.username", params):
+            entry = summaries.setdefault(row["username"], {
+                "username": row["username"], "age": row["age"], "usage_counts": {}, "usage_total": 0,
+            })
+            if row["app"] is not None:
+                entry["usage_counts"][row["app"]] = row["count"]
+                entry["usage_total"] += row["count"]
+        return list(summaries.values())
+
+    # --- Usage ---
+    def record_app_open(self, username: str, app_name: str) -> dict:
+        conn = self._connect()
+        with conn:
+            # Streak and counter are updated in single statements so concurrent
+            # sessions never read-modify-write the same row.
+            cur = conn.execute(
+                "UPDATE users SET"
+                " streak_len = CASE WHEN last_opened_app = ? THEN streak_len + 1 ELSE 1 END,"
+                " streak_app = ?, last_opened_app = ? WHERE username = ?",
+                (app_name, app_name, app_name, username),
+            )
+            if cur.rowcount == 0:
+                return {}
+            conn.execute(
+                "INSERT INTO usage_counts (username, app, count) VALUES (?, ?, 1)"
+                " ON CONFLICT(username, app) DO UPDATE SET count = count + 1",
+                (username, app_name),
+            )
+        return self.load(username)
+
+    # --- Reminders ---
+    def add_reminder(self, username: str, text: str, due_iso, created_at: str) -> dict:
+        conn = self._connect()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO reminders (username, text, due, created_at) VALUES (?, ?, ?, ?)",
+                (username, text, due_iso, created_at),
+            )
+        return {"id": str(cur.lastrowid), "text": text, "due": due_iso, "created_at": created_at}
+
+    def list_reminders(self, username: str) -> list:
+        return self._reminders(self._connect(), username)
+
+    def upcoming_reminders(self, username: str, n: int, now: datetime) -> list:
+        rows = self._connect().execute(
+            "SELECT id, text, due, created_at FROM reminders"
+            " WHERE username = ? AND done_at IS NULL AND due >= ? ORDER BY due, id LIMIT ?",
+            (username, now.isoformat(), n),
+        )
+        return self._reminder_rows(rows)
+
+    def reminders_between(self, username: str, start: datetime, end: datetime) -> list:
+        rows = self._connect().execute(
+            "SELECT id, text, due, created_at FROM reminders"
+            " WHERE username = ? AND done_at IS NULL AND due >= ? AND due < ? ORDER BY due, id",
+            (username, start.isoformat(), end.isoformat()),
+        )
+        return self._reminder_rows(rows)
+
+    def complete_reminder(self, username: str, reminder_id) -> bool:
+        conn = self._connect()
+        with conn:
+            cur = conn.execute(
+                "UPDATE reminders SET done_at = ? WHERE id = ? AND username = ? AND done_at IS NULL",
+                (datetime.now().isoformat(), int(reminder_id), username),
+            )
+        return cur.rowcount > 0
+
+    def delete_reminder(self, username: str, reminder_id) -> bool:
+        conn = self._connect()
+        with conn:
+            cur = conn.execute("DELETE FROM reminders WHERE id = ? AND username = ?", (int(reminder_id), username))
+        return cur.rowcount > 0
+
+def migrate_json_profiles(db_path: str) -> int:
+    """Copy every JSON profile (including pending usage events) into a SQLite store."""
+    from . import profile_manager
+
+    store = SQLiteProfileStore(db_path)
+    migrated = 0
+    for filename in sorted(os.listdir(profile_manager.PROFILES_DIR)):
+        if not filename.endswith(".json"):
+            continue
+        username = filename[:-len(".json")]
+        profile = profile_manager._json_get_user_profile(username)
+        if profile is None:
+            continue
+        profile.setdefault("username", username)
+        if store.create(profile):
+            migrated += 1
+        else:
+            print(f"Skipping {username}: already in {db_path}")
+    return migrated
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python -m core.sqlite_store migrate [db_path]")
+        sys.exit(1)
+    from . import profile_manager
+
+    dst = sys.argv[2] if len(sys.argv) > 2 else profile_manager.PROFILE_DB_PATH
+    count = migrate_json_profiles(dst)
+    print(f"Migrated {count} profile(s) from {profile_manager.PROFILES_DIR} to {dst}")
@@ -5,19 +5,22 @@ import pandas as pd
 import speech_recognition as sr
 import pyttsx3
 import io
+import html
 from pydub import AudioSegment
 from streamlit_mic_recorder import mic_recorder
 
-from core.ai_feed import generate_feed_cards
+from core.ai_content_generator import cached_personalized_content, stream_personalized_content
+from core.ai_feed import iter_feed_cards
 from core.profile_manager import (
     ensure_profile_defaults,
+    get_user_profile,
     record_app_open,
     update_user_profile,
-    get_all_profiles,
-    get_user_profile,    
+    get_household_usage,
     list_reminders,
 )
-from core.assistant import parse_intent, handle_intent
+from core.assistant import AssistantContext, resolve_command
+from core.model_client import get_client
 
 # --- Page Config ---
 st.set_page_config(page_title="Dashboard", page_icon="📱", layout="centered")
@@ -34,8 +37,10 @@ profile = ensure_profile_defaults(st.session_state["user_profile"])
 username = profile.get("username", "User")
 age = int(profile.get("age", 18))
 
-if not profile.get("guest_mode"):
-    update_user_profile(username, profile)
+if not profile.get("guest_mode") and not update_user_profile(username, profile):
+    # This tab's copy is too stale to merge; pick up the stored profile instead.
+    profile = ensure_profile_defaults(get_user_profile(username) or profile)
+    st.session_state["user_profile"] = profile
 
 if f"{username}_state" not in st.session_state:
     st.session_state[f"{username}_state"] = {"active_app": None, "notes_content": "Type your notes here..."}
@@ -133,6 +138,13 @@ if profile.get("guest_mode"):
 
 st.session_state["enable_tts"] = st.sidebar.checkbox("🔊 Voice Replies", value=True)
 
+with st.sidebar.expander("⚡ Model latency"):
+    latency = get_client().latency_summary()
+    if latency:
+        st.dataframe(pd.DataFrame(latency).T.round(1))
+    else:
+        st.caption("No model calls yet.")
+
 if st.sidebar.button("🚪 Logout"):
     if not profile.get("guest_mode"):
         update_user_profile(username, profile)
@@ -212,38 +224,51 @@ else:
         if user_reminders:
             st.markdown('<div class="card">', unsafe_allow_html=True)
             st.subheader("⏰ Reminders")
-            df_r = pd.DataFrame(user_reminders).fillna("soon")
+            df_r = pd.DataFrame(user_reminders).drop(columns=["id"], errors="ignore").fillna("soon")
             st.table(df_r.head(5))
             st.markdown("</div>", unsafe_allow_html=True)
 
+    # --- Daily Briefing ---
+    # Prewarmed per age bracket each day, so this is normally a cache read.
+    # A briefing still being generated is streamed into its slot at the end
+    # of the page, after everything else has rendered.
+    with st.expander("📰 Daily Briefing"):
+        briefing_slot = st.empty()
+        briefing = cached_personalized_content(profile)
+        if briefing is None:
+            briefing_slot.caption("⏳ Today's briefing is being prepared…")
+        else:
+            briefing_slot.markdown(briefing)
+
     # --- AI Feed ---
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.subheader("🧠 AI Feed")
-    feed_cards = generate_feed_cards(profile)
-    if not feed_cards:
+    # Cards appear as soon as they are ready; a slot is redrawn when its polished text arrives.
+    feed_slots = {}
+    for position, card in iter_feed_cards(profile):
+        if position not in feed_slots:
+            feed_slots[position] = st.empty()
+        feed_slots[position].markdown(f"""
+            <div style="border-radius:12px;padding:12px;margin:10px 0;
+            background:white;border:1px solid rgba(0,0,0,.05);
+            box-shadow: 0 2px 6px rgba(0,0,0,.04);">
+            {card.get('icon','📌')} <b>{card.get('title','')}</b><br>
+            <span style="opacity:.9">{card.get('body','')}</span>
+            </div>""", unsafe_allow_html=True)
+    if not feed_slots:
         st.info("No insights yet. Open some apps!")
-    else:
-        for card in feed_cards:
-            st.markdown(f"""
-                <div style="border-radius:12px;padding:12px;margin:10px 0;
-                background:white;border:1px solid rgba(0,0,0,.05);
-                box-shadow: 0 2px 6px rgba(0,0,0,.04);">
-                {card.get('icon','📌')} <b>{card.get('title','')}</b><br>
-                <span style="opacity:.9">{card.get('body','')}</span>
-                </div>""", unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
     # --- Digital Wellbeing ---
     if age >= 18 and not profile.get("guest_mode") and any(app[0] == "Wellbeing" for app in apps_to_display):
         st.markdown('<div class="card">', unsafe_allow_html=True)
         st.subheader("📊 Digital Wellbeing")
-        child_profiles = [p for p in get_all_profiles() if p.get("age", 18) < 18]
+        child_profiles = get_household_usage(18)
 
         if not child_profiles:
             st.info("No child profiles linked.")
         else:
-            for child in child_profiles:
-                child_data = get_user_profile(child["username"]) or child
+            for child_data in child_profiles:
                 with st.expander(f"{child_data['username']}'s Usage"):
                     usage_data = child_data.get("usage_counts", {})
                     if not usage_data:
@@ -257,9 +282,18 @@ else:
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.subheader("Assistant 🎙️")
     
-    for msg in st.session_state[f"{username}_assistant"]:
+    def assistant_bubble(msg):
         role = "You" if msg["role"] == "user" else "Assistant"
-        st.markdown(f'<div class="assistant-bubble"><b>{role}:</b> {msg["text"]}</div>', unsafe_allow_html=True)
+        # Typed commands and model replies are free-form text, never markup.
+        return f'<div class="assistant-bubble"><b>{role}:</b> {html.escape(msg["text"])}</div>'
+
+    # Model answers still on their way keep a slot, filled in below once they arrive.
+    pending_slots = []
+    for msg in st.session_state[f"{username}_assistant"]:
+        slot = st.empty()
+        slot.markdown(assistant_bubble(msg), unsafe_allow_html=True)
+        if msg.get("pending") is not None:
+            pending_slots.append((slot, msg))
     
     voice_cmd = None
     audio = mic_recorder(start_prompt="Speak", stop_prompt="⏹ Stop", key="voice_input")
@@ -283,14 +317,32 @@ else:
 
     if user_input:
         st.session_state[f"{username}_assistant"].append({"role": "user", "text": user_input})
-        intent = parse_intent(user_input, [name for name, _ in apps_to_display])
-        reply, app_to_open = handle_intent(username, [name for name, _ in apps_to_display], intent, user_input)
+        reply, app_to_open, pending = resolve_command(username, [name for name, _ in apps_to_display], user_input,
+                                                      context=AssistantContext(username, profile))
         
-        st.session_state[f"{username}_assistant"].append({"role": "assistant", "text": reply})
-        if st.session_state.get("enable_tts", True):
+        st.session_state[f"{username}_assistant"].append({"role": "assistant", "text": reply, "pending": pending})
+        if pending is None and st.session_state.get("enable_tts", True):
             st.session_state.tts_engine = speak_text(st.session_state.tts_engine, reply)
         
         if app_to_open: open_app(app_to_open)
         else: st.rerun()
             
-    st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # Wait in short steps so each model answer shows as soon as it arrives (bounded by its timeout).
+    while pending_slots:
+        still_pending = []
+        for slot, msg in pending_slots:
+            reply = msg["pending"].result(wait=0.25 / len(pending_slots))
+            if reply is None:
+                still_pending.append((slot, msg))
+                continue
+            msg["text"], msg["pending"] = reply, None
+            slot.markdown(assistant_bubble(msg), unsafe_allow_html=True)
+            if st.session_state.get("enable_tts", True):
+                st.session_state.tts_engine = speak_text(st.session_state.tts_engine, reply)
+        pending_slots = still_pending
+
+    if briefing is None:
+        with briefing_slot.container():
+            st.write_stream(stream_personalized_content(profile))
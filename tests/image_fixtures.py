@@ -0,0 +1,42 @@
+# tests/image_fixtures.py
+"""Seeded camera-like frames shared by the image hash tests and benchmarks."""
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_frame(width, height, seed):
+    """A smooth, face-photo-like JPEG (soft blobs plus sensor noise)."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width] / max(width, height)
+    frame = np.zeros((height, width, 3))
+    for _ in range(6):
+        cx, cy, spread = rng.random(3)
+        blob = np.exp(-((x - cx) ** 2 + (y - cy * height / width) ** 2) / (0.02 + 0.1 * spread))
+        frame += rng.random(3) * 255 * blob[..., None]
+    frame += rng.normal(0, 6, frame.shape)
+    frame = np.clip(frame / frame.max() * 255, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(frame).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def png_mode_variants(frame_bytes):
+    """The frame as palette, 1-bit and 16-bit grayscale PNGs (modes Image.reduce() rejects)."""
+    image = Image.open(io.BytesIO(frame_bytes))
+    variants = [image.convert("P"), image.convert("1"),
+                Image.fromarray(np.asarray(image.convert("L"), dtype=np.uint16)).convert("I;16")]
+    encoded = []
+    for variant in variants:
+        buf = io.BytesIO()
+        variant.save(buf, "PNG")
+        encoded.append(buf.getvalue())
+    return encoded
+
+
+def frame_corpus(resolutions=((640, 480), (1280, 720), (1920, 1080)), frames=30):
+    """[(label, [frame bytes, ...]), ...]: JPEG webcam frames per resolution, plus PNGs in awkward modes."""
+    corpus = [(f"{w}x{h}", [synthetic_frame(w, h, seed) for seed in range(frames)]) for w, h in resolutions]
+    corpus.append(("png P/1/I;16", [png for seed in range(3) for png in png_mode_variants(synthetic_frame(1280, 720, seed))]))
+    return corpus
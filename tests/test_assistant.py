@@ -0,0 +1,39 @@
+# tests/test_assistant.py
+import pytest
+
+import core.assistant as assistant
+from core.assistant import THINKING_REPLY, parse_intent, resolve_command
+
+APPS = ["Workspace", "Mail", "Calendar"]
+
+OPEN_QUESTIONS = [
+    "can you explain photosynthesis",
+    "which planet is the biggest",
+    "translate thank you to french",
+    "is this a good name for a cat",
+]
+
+
+@pytest.mark.parametrize("text", ["hi", "Hi!", "hey there", "yo", "hello, assistant", "Good morning", "how r u"])
+def test_greetings_still_greet(text):
+    assert parse_intent(text, APPS) == {"action": "greet"}
+
+
+@pytest.mark.parametrize("text", OPEN_QUESTIONS)
+def test_greeting_words_inside_other_words_do_not_greet(text):
+    assert parse_intent(text, APPS) == {"action": "unknown"}
+
+
+@pytest.mark.parametrize("text", OPEN_QUESTIONS)
+def test_open_questions_reach_the_model_fallback(text, monkeypatch):
+    asked = []
+
+    def fake_ask(command, context=None):
+        asked.append(command)
+        return object()
+
+    monkeypatch.setattr(assistant, "ask_model_async", fake_ask)
+    reply, app_to_open, pending = resolve_command("ana", APPS, text)
+    assert (reply, app_to_open) == (THINKING_REPLY, None)
+    assert pending is not None
+    assert asked == [text]
@@ -0,0 +1,88 @@
+# tests/test_briefing.py
+import time
+
+import pytest
+
+import core.ai_content_generator as gen
+from core.llm_cache import TwoLevelCache
+from core.model_client import ModelError
+
+PROFILE = {"username": "Ana", "age": 30}
+
+
+class FakeClient:
+    cache_name = "fake:model"
+
+    def __init__(self, available=True, chunks=None):
+        self._available = available
+        self._chunks = chunks
+        self.streams = 0
+
+    def available(self):
+        return self._available
+
+    def stream(self, prompt):
+        self.streams += 1
+        if self._chunks is None:
+            raise ModelError("backend down")
+        yield from self._chunks
+
+
+@pytest.fixture
+def briefing(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "_briefing_cache", TwoLevelCache(str(tmp_path / "cache.sqlite3"), table="briefing_cache"))
+    monkeypatch.setattr(gen, "_briefing_streams", {})
+    return gen
+
+
+def _wait_done(stream):
+    deadline = time.monotonic() + 5
+    while not stream.done and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_unavailable_model_gets_fallback_without_generating(briefing, monkeypatch):
+    client = FakeClient(available=False)
+    monkeypatch.setattr(briefing, "get_client", lambda: client)
+    for _ in range(3):
+        assert briefing.cached_personalized_content(PROFILE) == briefing.FALLBACK_BRIEFING
+    assert client.streams == 0
+
+
+def test_failed_generation_backs_off(briefing, monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(briefing, "get_client", lambda: client)
+    # The fake fails at once, so this may already see the failure.
+    assert briefing.cached_personalized_content(PROFILE) in (None, briefing.FALLBACK_BRIEFING)
+    _wait_done(next(iter(briefing._briefing_streams.values())))
+
+    for _ in range(5):
+        assert briefing.cached_personalized_content(PROFILE) == briefing.FALLBACK_BRIEFING
+    assert client.streams == 1
+
+    stream = next(iter(briefing._briefing_streams.values()))
+    stream.retry_at = 0.0
+    briefing.cached_personalized_content(PROFILE)
+    retried = next(iter(briefing._briefing_streams.values()))
+    _wait_done(retried)
+    assert client.streams == 2
+    assert retried.failures == 2
+    assert retried.retry_at - time.monotonic() > briefing.BRIEFING_RETRY_DELAY
+
+
+def test_finished_generation_is_cached_with_name(briefing, monkeypatch):
+    client = FakeClient(chunks=["Hi [[NA", "ME]], ", "have a good day."])
+    monkeypatch.setattr(briefing, "get_client", lambda: client)
+    assert "".join(briefing.stream_personalized_content(PROFILE)) == "Hi Ana, have a good day."
+    assert briefing.cached_personalized_content(PROFILE) == "Hi Ana, have a good day."
+    assert client.streams == 1
+
+
+def test_cache_tables_trim_independently(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    polish = TwoLevelCache(path, ttl=3600)
+    briefings = TwoLevelCache(path, ttl=0.0, table="briefing_cache")
+    polish.put("card text", "m", "polished")
+    briefings.trim()
+    polish._memory.clear()
+    assert polish.get("card text", "m") == "polished"
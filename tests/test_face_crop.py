@@ -0,0 +1,56 @@
+# tests/test_face_crop.py
+import io
+
+import pytest
+from PIL import Image
+
+import core.biometric_auth as auth
+from core.biometric_auth import SIMILARITY_THRESHOLD, compare_hashes, get_face_hash, get_image_hash
+from tests.image_fixtures import synthetic_frame
+
+FRAMES = [synthetic_frame(w, h, seed) for (w, h) in ((640, 480), (1280, 720), (1920, 1080)) for seed in range(4)]
+
+
+def _central_box(image, detect_width=None):
+    """Stand-in detector: the middle of the frame, in the coordinates of the image it is given."""
+    return (image.width * 3 // 10, image.height // 5, image.width * 7 // 10, image.height * 4 // 5)
+
+
+def _exact_crop_hash(frame):
+    image = Image.open(io.BytesIO(frame))
+    image.load()
+    return auth._dhash(image.crop(_central_box(image)).convert("L"))
+
+
+@pytest.fixture
+def stub_detector(monkeypatch):
+    monkeypatch.setattr(auth, "face_detection_enabled", lambda: True)
+    monkeypatch.setattr(auth, "detect_face", _central_box)
+
+
+def test_crop_from_draft_decode_matches_full_decode(stub_detector):
+    for frame in FRAMES:
+        assert compare_hashes(get_face_hash(frame), _exact_crop_hash(frame)) <= SIMILARITY_THRESHOLD
+
+
+def test_crop_path_skips_full_decode(stub_detector, monkeypatch):
+    decoded = []
+
+    def record(image, detect_width=None):
+        decoded.append(image.size)
+        return _central_box(image, detect_width)
+
+    monkeypatch.setattr(auth, "detect_face", record)
+    get_face_hash(synthetic_frame(1920, 1080, 0))
+    assert decoded and decoded[0][0] < 1920 // 2
+
+
+@pytest.mark.skipif(not auth.face_detection_enabled(), reason="opencv-python not installed or FACE_DETECT=0")
+def test_cascade_on_and_off_hashes_stay_within_threshold(monkeypatch):
+    for frame in FRAMES:
+        with_cascade = get_face_hash(frame)
+        monkeypatch.setattr(auth, "face_detection_enabled", lambda: False)
+        without_cascade = get_face_hash(frame)
+        monkeypatch.undo()
+        assert compare_hashes(with_cascade, without_cascade) <= SIMILARITY_THRESHOLD
+        assert compare_hashes(without_cascade, get_image_hash(frame, fast=False)) <= SIMILARITY_THRESHOLD
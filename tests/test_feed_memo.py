@@ -0,0 +1,41 @@
+# tests/test_feed_memo.py
+import pytest
+
+import core.ai_feed as feed
+from core.llm_cache import TwoLevelCache
+from core.model_client import ModelClient
+
+PROFILE = {"username": "ana", "age": 30, "usage_counts": {"Mail": 3}, "last_opened_app": "Mail",
+           "streak": {"app": "Mail", "len": 2}, "reminders": []}
+
+
+@pytest.fixture
+def no_model(tmp_path, monkeypatch):
+    """A feed whose model backend cannot initialize, with empty caches and a build counter."""
+    client = ModelClient(backend="missing")
+    monkeypatch.setattr(feed, "get_client", lambda: client)
+    monkeypatch.setattr(feed, "_polish_cache", TwoLevelCache(str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(feed, "_feed_memo", feed.OrderedDict())
+    builds = []
+    real_build = feed._build_cards
+    monkeypatch.setattr(feed, "_build_cards", lambda *a: builds.append(1) or real_build(*a))
+    return client, builds
+
+
+def test_raw_feed_is_memoized_while_model_is_unavailable(no_model):
+    client, builds = no_model
+    first = feed.generate_feed_cards(PROFILE)
+    assert client.unavailable_for() > 0
+    for _ in range(3):
+        assert feed.generate_feed_cards(PROFILE) == first
+    assert len(builds) == 1
+
+
+def test_raw_feed_memo_expires_when_model_may_be_back(no_model):
+    client, builds = no_model
+    feed.generate_feed_cards(PROFILE)
+    key = next(iter(feed._feed_memo))
+    cards, _ = feed._feed_memo[key]
+    feed._feed_memo[key] = (cards, 0.0)
+    feed.generate_feed_cards(PROFILE)
+    assert len(builds) == 2
@@ -0,0 +1,70 @@
+# tests/test_hamming_index.py
+import random
+
+import numpy as np
+import pytest
+
+from core.biometric_auth import FACE_INDEX_MIN_ENROLLMENT, SIMILARITY_THRESHOLD, FaceTemplateMatrix
+from core.hamming_index import MultiIndexHash, popcount64
+
+
+@pytest.fixture(scope="module")
+def enrollment():
+    """FACE_INDEX_MIN_ENROLLMENT random templates and queries: half near an enrolled one, half random."""
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(FACE_INDEX_MIN_ENROLLMENT)]
+    queries = []
+    for i in range(100):
+        if i % 2:
+            queries.append(rng.getrandbits(64))
+            continue
+        v = values[rng.randrange(len(values))]
+        for bit in rng.sample(range(64), rng.randint(0, SIMILARITY_THRESHOLD)):
+            v ^= 1 << bit
+        queries.append(v)
+    return values, queries
+
+
+def _brute_force(matrix, query, radius):
+    dists = popcount64(matrix ^ np.uint64(query))
+    return sorted(int(i) for i in np.flatnonzero(dists <= radius))
+
+
+def test_radius_query_matches_brute_force(enrollment):
+    values, queries = enrollment
+    index = MultiIndexHash.from_items(enumerate(values))
+    matrix = np.array(values, dtype=np.uint64)
+    for q in queries:
+        hits = sorted(k for k, _ in index.radius_query(q, SIMILARITY_THRESHOLD))
+        assert hits == _brute_force(matrix, q, SIMILARITY_THRESHOLD)
+
+
+def test_radius_query_touches_a_small_fraction(enrollment):
+    values, queries = enrollment
+    index = MultiIndexHash.from_items(enumerate(values))
+    touched = sum(len(np.unique(index.candidates(q, SIMILARITY_THRESHOLD))) for q in queries)
+    assert touched / len(queries) < 0.02 * len(values)
+
+
+def test_insert_and_delete_keep_index_consistent():
+    rng = random.Random(3)
+    index = MultiIndexHash()
+    for key in range(200):
+        index.insert(key, rng.getrandbits(64))
+    for key in range(0, 200, 3):
+        assert index.delete(key)
+    index.insert(1, 0)
+    assert len(index) == 200 - 67
+    assert index.radius_query(0, 0) == [(1, 0)]
+    for key in range(0, 200, 3):
+        assert key not in index
+
+
+def test_template_matrix_uses_index_at_threshold_size(enrollment):
+    values, queries = enrollment
+    templates = [(f"user{i}", v) for i, v in enumerate(values)]
+    indexed = FaceTemplateMatrix(templates)
+    scanned = FaceTemplateMatrix(templates, index_min_enrollment=len(values) + 1)
+    assert len(indexed) >= indexed.index_min_enrollment
+    for q in queries:
+        assert indexed.best_match(q) == scanned.best_match(q)
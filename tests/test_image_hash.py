@@ -0,0 +1,18 @@
+# tests/test_image_hash.py
+import pytest
+
+from core.biometric_auth import compare_hashes, get_image_hash
+from tests.image_fixtures import frame_corpus
+
+# The fast decode path may move the hash by a sliver of SIMILARITY_THRESHOLD, no more.
+MAX_FAST_PATH_DRIFT = 3
+
+CORPUS = frame_corpus(frames=5)
+
+
+@pytest.mark.parametrize("label,frames", CORPUS, ids=[label for label, _ in CORPUS])
+def test_fast_hash_matches_exact_hash(label, frames):
+    for data in frames:
+        exact = get_image_hash(data, fast=False)
+        fast = get_image_hash(data, fast=True)
+        assert compare_hashes(exact, fast) <= MAX_FAST_PATH_DRIFT
@@ -0,0 +1,100 @@
+# tests/test_profile_merge.py
+import threading
+
+import pytest
+
+import core.profile_manager as pm
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    """The JSON backend on an empty directory, with fresh caches and history."""
+    monkeypatch.setattr(pm, "PROFILES_DIR", str(tmp_path))
+    monkeypatch.setattr(pm, "PROFILE_INDEX_PATH", str(tmp_path / "profile_index.json"))
+    monkeypatch.setattr(pm, "_store", None)
+    monkeypatch.setattr(pm, "_index", None)
+    pm._cache.clear()
+    pm._events_cache.clear()
+    pm._history.clear()
+    pm._reminder_stores.clear()
+    pm.create_user_profile("ana", 30, "1234")
+    yield pm
+    # Run the debounced index flush now, while it still targets tmp_path.
+    pm._flush_index_at_exit()
+
+
+def test_stale_tab_changes_merge_with_other_writer(profiles):
+    stale = profiles.get_user_profile("ana")
+    other = profiles.get_user_profile("ana")
+    other["wallpaper"] = "beach"
+    assert profiles.update_user_profile("ana", other)
+
+    stale["streak_goal"] = 5
+    assert profiles.update_user_profile("ana", stale)
+
+    stored = profiles.get_user_profile("ana")
+    assert stored["wallpaper"] == "beach"
+    assert stored["streak_goal"] == 5
+
+
+def test_unchanged_stale_tab_does_not_revert_other_writer(profiles):
+    stale = profiles.get_user_profile("ana")
+    other = profiles.get_user_profile("ana")
+    other["wallpaper"] = "beach"
+    assert profiles.update_user_profile("ana", other)
+
+    assert profiles.update_user_profile("ana", stale)
+    assert profiles.get_user_profile("ana")["wallpaper"] == "beach"
+
+
+def test_stale_copy_without_base_is_refused(profiles):
+    stale = profiles.get_user_profile("ana")
+    other = profiles.get_user_profile("ana")
+    other["wallpaper"] = "beach"
+    assert profiles.update_user_profile("ana", other)
+    profiles._history.clear()
+
+    stale["wallpaper"] = "forest"
+    assert not profiles.update_user_profile("ana", stale)
+    assert profiles.get_user_profile("ana")["wallpaper"] == "beach"
+
+
+def test_conflicting_scalar_edits_last_writer_wins(profiles):
+    first = profiles.get_user_profile("ana")
+    first["settings"] = {"volume": 5}
+    assert profiles.update_user_profile("ana", first)
+    base = profiles.get_user_profile("ana")
+
+    first["settings"] = {"volume": 7}
+    base["settings"] = {"volume": 6}
+    assert profiles.update_user_profile("ana", first)
+    assert profiles.update_user_profile("ana", base)
+    assert profiles.get_user_profile("ana")["settings"] == {"volume": 6}
+
+
+def test_int_valued_dicts_are_not_summed():
+    merged = pm._merge_profiles({"settings": {"volume": 5}}, {"settings": {"volume": 7}}, {"settings": {"volume": 6}})
+    assert merged["settings"] == {"volume": 6}
+
+
+def test_counter_fields_add_both_deltas():
+    merged = pm._merge_values({"Notes": 2}, {"Notes": 5, "Mail": 1}, {"Notes": 3}, counter=True)
+    assert merged == {"Notes": 6, "Mail": 1}
+
+
+def test_concurrent_writers_lose_no_updates(profiles):
+    writers, increments = 8, 25
+
+    def bump(profile):
+        profile["clicks"] = profile.get("clicks", 0) + 1
+
+    def worker():
+        for _ in range(increments):
+            assert profiles.update_profile_with("ana", bump, retries=1000) is not None
+
+    threads = [threading.Thread(target=worker) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert profiles.get_user_profile("ana")["clicks"] == writers * increments